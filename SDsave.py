@@ -1,4 +1,4 @@
-import machine, sdcard, os, utime, configparser, ssd1306
+import machine, sdcard, os, utime, settings, ssd1306, records, struct, rollups, errors
 
 spi = machine.SPI(0, sck=machine.Pin(18), mosi=machine.Pin(19), miso=machine.Pin(16))
 cs = machine.Pin(17, machine.Pin.OUT)
@@ -9,6 +9,40 @@ oled.fill(0) # clear the display
 
 led = machine.Pin("LED", machine.Pin.OUT) # set up the onboard LED for a saving indicator
 
+# write behind buffers, lines are kept in RAM per file and written in one go when the buffer gets big or old.
+# Off until main turns it on so errors while starting up are written straight away
+write_behind = False
+flush_size = 512 # bytes buffered for a file before it is written
+flush_age = 30000 # ms the oldest buffered line can wait before it is written
+max_buffered = 4096 # bytes a file can hold if the card can't be written to, lines past this are dropped. Flush Size
+# is capped at half of this in settings.py so a file is always written well before it fills up
+buffers = {} # filename: [lines, bytes, time first line was buffered], only used from the first core so no lock
+bytes_buffered = 0 # bytes waiting in RAM
+bytes_flushed = 0 # bytes written to the card
+bytes_dropped = 0
+flushes = 0
+
+# sectors cached in front of the card (see sdcard.SectorCache), 0 talks to the card directly. Set here as
+# settings.ini is on the card
+cache_sectors = 8
+cache = None
+
+# the data log is split into one file per period (a day by default) in the data folder. The manifest keeps each
+# segment's time range, row count and size so downloads and pruning never have to open the segments
+DATA_DIR = "data"
+MANIFEST = "data/manifest.csv"
+manifest = [] # [file name, first time, last time, rows, bytes], oldest first, times are seconds since 1970
+manifest_dirty = False
+
+# each segment has a sparse index next to it (data/YYYY-MM-DD.idx) of (seconds since 1970, byte offset) pairs, one
+# whenever the hour changes or every Index Rows rows, so a time range can be found without reading the segment
+INDEX = "<II"
+INDEX_SIZE = struct.calcsize(INDEX)
+index_state = {} # segment name: [hour of the last index entry, rows since it]
+
+# hourly and daily rollups of the data log (see rollups.py), kept forever as they are tiny
+ROLLUPS = {3600: "data/hourly.bin", 86400: "data/daily.bin"}
+
 def make_readable(seconds): 
     """
     Format seconds into 00:00:00
@@ -19,24 +53,26 @@ def initialise():
     """
     Set up the microSD card
     """
+    global cache
     try:
         led.on()
         sd = sdcard.SDCard(spi, cs)
+        if cache_sectors: sd = cache = sdcard.SectorCache(sd, cache_sectors)
 
         vfs = os.VfsFat(sd) # type: ignore
         os.mount(vfs, "/sd") # type: ignore
         os.chdir("/sd")
-        config = configparser.ConfigParser()
-        config.read("settings.ini")
-
-        if config["Other"]["File Type"] == "csv":
-            try: open("data.csv", "r").close()
-            except: 
-                with open("data.csv","w") as file:
-                    file.write("Date;Time;Max RPM;Avg RPM;Rotations;Temperature;Humidity\n")
-        elif config["Other"]["File Type"] == "txt":
-            try: open("data.txt", "r").close()
-            except: open("data.txt","w").close()
+        config = settings.Settings()
+        try: config.load("settings.ini")
+        except (OSError, ValueError): config = None # missing or invalid settings.ini, main reports it
+
+        # data segments, each segment file is created with its header when its first row is saved
+        try: os.mkdir(DATA_DIR)
+        except OSError: pass # already exists
+        load_manifest()
+        for name in ROLLUPS.values():
+            try: os.stat(name)
+            except OSError: write(name, rollups.header(3600 if "hourly" in name else 86400))
 
         # save errors to log
         try: open("error.log", "r").close()
@@ -49,57 +85,205 @@ def initialise():
     except Exception as e:
         return [None, e]
 
-# def data(data:str, time: str):
-#     # highest_rpm, avg_rpm, total_rotations, temp, hum
-#     """
-#     Saves readings to the 'data.txt' file
-#     """
-#     with open("data.txt", "a") as file: file.write(f"{time}, {data}\n")
+def write(filename:str, line):
+    """
+    Buffers a line (str) or record (bytes) for the given file, the file is written once flush_size bytes are waiting
+    """
+    global bytes_buffered, bytes_dropped
+    buffer = buffers.get(filename)
+    if buffer is None:
+        buffer = buffers[filename] = [[], 0, utime.ticks_ms()]
+    if buffer[1] + len(line) > max_buffered: # card isn't being written to, don't run out of memory
+        bytes_dropped += len(line)
+        return
+    if not buffer[0]: buffer[2] = utime.ticks_ms()
+    buffer[0].append(line)
+    buffer[1] += len(line)
+    bytes_buffered += len(line)
+    full = buffer[1] >= flush_size or not write_behind
+    if full: flush(filename)
+
+def flush(filename:str=None):
+    """
+    Writes the buffered lines for a file, or every file if no filename is given. Called on shutdown too
+    """
+    global bytes_buffered, bytes_flushed, flushes
+    for name in ([filename] if filename else list(buffers)):
+        buffer = buffers.get(name)
+        if not buffer or not buffer[0]: continue
+        try:
+            led.on()
+            if isinstance(buffer[0][0], bytes):
+                with open(name, "ab") as file: file.write(b"".join(buffer[0]))
+            else:
+                with open(name, "a") as file: file.write("".join(buffer[0]))
+            led.off()
+        except Exception as e:
+            oled.fill(0)
+            oled.text("ERR: 1", 0, 0)
+            oled.show()
+            raise e # lines are kept so the next flush tries again
+        bytes_buffered -= buffer[1]
+        bytes_flushed += buffer[1]
+        flushes += 1
+        buffer[0].clear()
+        buffer[1] = 0
+    if manifest_dirty and not segments_buffered(): save_manifest()
 
-def data(data:str, time: str):
-    # highest_rpm, avg_rpm, total_rotations, temp, hum
+def flush_due():
     """
-    Saves readings to the 'data.txt' or the 'data.csv' file
+    Writes any file whose oldest buffered line has waited longer than flush_age, and the summaries of repeated errors
     """
+    summarise()
+    now = utime.ticks_ms()
+    for name in list(buffers):
+        buffer = buffers[name]
+        if buffer[0] and utime.ticks_diff(now, buffer[2]) >= flush_age: flush(name)
+
+def load_manifest():
+    global manifest
+    manifest = []
     try:
-        config = configparser.ConfigParser()
-        config.read("settings.ini")
-        led.on()
-        if config["Other"]["File Type"] == "csv": 
-            with open("data.csv", "a") as file: file.write(f"{time};{data}\n")
-        elif config["Other"]["File Type"] == "txt":
-            with open("data.txt", "a") as file: file.write(f"{time}, {data}\n")
-        led.off()
-    except Exception as e:
-        oled.fill(0)
-        oled.text("ERR: 1", 0, 0)
-        oled.show()
-        raise e
+        with open(MANIFEST, "r") as file:
+            file.readline() # header
+            for line in file:
+                name, first, last, rows, size = line.strip().split(";")
+                manifest.append([name, int(first), int(last), int(rows), int(size)])
+    except OSError: pass # no manifest yet
+    if manifest: # a reset between writing the last segment and the manifest leaves its size behind the card
+        try: manifest[-1][4] = os.stat(manifest[-1][0])[6]
+        except OSError: pass
 
-def error(error:Exception, desc:str, time:str='N/A'):
+def segments_buffered() -> bool:
+    """
+    True if any data segment has rows waiting in RAM, the manifest already counts them so it can't be saved yet
+    """
+    for entry in manifest:
+        buffer = buffers.get(entry[0])
+        if buffer and buffer[0]: return True
+    return False
+
+def save_manifest():
+    """
+    Rewrites the manifest, flush() only calls it once no data segment has rows left in RAM so it always matches
+    what is on the card
+    """
+    global manifest_dirty
+    with open(MANIFEST, "w") as file:
+        file.write("File;First;Last;Rows;Bytes\n")
+        for entry in manifest: file.write(";".join(str(v) for v in entry) + "\n")
+    manifest_dirty = False
+
+def segment(seconds:int, file_type:str) -> list:
+    """
+    Returns the manifest entry of the segment the given time belongs to, starting a new segment if needed
+    """
+    config = settings.Settings()
+    period = config.segment_days * 86400
+    start = records.from_epoch(seconds - seconds % period) if seconds else (0, 0, 0)
+    name = f"{DATA_DIR}/{start[0]:04d}-{start[1]:02d}-{start[2]:02d}.{file_type}"
+    for entry in reversed(manifest): # almost always the last one
+        if entry[0] == name: return entry
+    entry = [name, seconds, seconds, 0, 0]
+    try: entry[4] = os.stat(name)[6] # segment without a manifest entry, carry on from its size
+    except OSError: # new segment, start with its header
+        header = records.header() if file_type == "bin" else records.CSV_HEADER if file_type == "csv" else ""
+        if header:
+            write(name, header)
+            entry[4] = len(header)
+    manifest.append(entry)
+    index_state.clear() # only the current segment is indexed
+    prune(seconds)
+    return entry
+
+def prune(seconds:int):
     """
-    Saves errors to the 'error log.txt' file
+    Deletes segments that ended more than Keep Days ago, 0 keeps everything
     """
+    global manifest_dirty
+    config = settings.Settings()
+    if config.keep_days <= 0: return
+    oldest = seconds - config.keep_days * 86400
+    while len(manifest) > 1 and manifest[0][2] < oldest:
+        name = manifest.pop(0)[0]
+        for path in (name, index_name(name)):
+            try: os.remove(path)
+            except OSError: pass
+        manifest_dirty = True
+
+def data(time:tuple, values):
+    # highest_rpm, avg_rpm, total_rotations, temp, hum, min_rpm, rpm_std, rpm_p50, rpm_p90, min/max/avg temp, min/max/avg hum, max/avg speed
+    """
+    Saves readings to the current data segment as a txt/csv line or a binary record (see records.py)
+    """
+    global manifest_dirty
+    config = settings.Settings()
+    seconds = records.epoch(time) if time[0] >= 2000 else 0 # 0 if the rtc module couldn't give the time
+    entry = segment(seconds, config.file_type)
+    if config.file_type == "bin": line = records.pack(seconds, values)
+    else: line = records.format_line(time, values, config.file_type)
+    index(entry, seconds, config.index_rows)
+    write(entry[0], line)
+    if not entry[3]: entry[1] = seconds
+    entry[2] = seconds
+    entry[3] += 1
+    entry[4] += len(line)
+    manifest_dirty = True
+    if seconds: # rollups need the time
+        for rollup, record in rollups.add(seconds, values): write(ROLLUPS[rollup.period], record)
+
+def index_name(name:str) -> str:
+    return name.rsplit(".", 1)[0] + ".idx"
+
+def index(entry:list, seconds:int, rows:int):
+    """
+    Adds an index entry pointing at the row about to be saved if the hour has changed or enough rows have passed.
+    The first row saved after starting up is always indexed
+    """
+    state = index_state.get(entry[0])
+    if state is None or state[0] != seconds // 3600 or state[1] >= rows:
+        write(index_name(entry[0]), struct.pack(INDEX, seconds, entry[4]))
+        state = index_state[entry[0]] = [seconds // 3600, 0]
+    state[1] += 1
+
+def index_offset(name:str, seconds:int) -> int:
+    """
+    Byte offset of the last indexed row at or before the given time, found with a binary search of the index so it
+    only reads a few blocks. 0 if the segment has no index or starts after the time
+    """
+    offset = 0
     try:
-        led.on()
-        with open("error.log", "a") as file: file.write(f"Elapsed: [{make_readable(round(utime.ticks_ms()/1000))}], Time: {time}, {str(error)}, {desc}\n")
-        led.off()
-    except Exception as e:
-        oled.fill(0)
-        oled.text("ERR: 1", 0, 0)
-        oled.show()
-        raise e
+        with open(index_name(name), "rb") as file:
+            buf = bytearray(INDEX_SIZE)
+            low, high = 0, file.seek(0, 2) // INDEX_SIZE
+            while low < high:
+                middle = (low + high) // 2
+                file.seek(middle * INDEX_SIZE)
+                file.readinto(buf)
+                time, position = struct.unpack(INDEX, buf)
+                if time <= seconds:
+                    offset = position
+                    low = middle + 1
+                else: high = middle
+    except OSError: pass # no index, read the segment from the start
+    return offset
+
+def error(error:Exception, desc:str, time:str='N/A'):
+    """
+    Saves errors to the 'error log.txt' file, repeats of the same error are counted and saved as one line (see errors.py)
+    """
+    if not errors.add(error, desc, time): return
+    write("error.log", f"Elapsed: [{make_readable(round(utime.ticks_ms()/1000))}], Time: {time}, {str(error)}, {desc}\n")
 
 def debug(data:str, time:str):
     """
     Saves debug statements to the 'debug log.txt' file
     """
-    try:
-        led.on()
-        with open("debug.log", "a") as file: file.write(f"Elapsed: [{make_readable(round(utime.ticks_ms()/1000))}], Time: {time}, {data}\n")
-        led.off()
-    except Exception as e:
-        oled.fill(0)
-        oled.text("ERR: 1", 0, 0)
-        oled.show()
-        raise e
\ No newline at end of file
+    write("debug.log", f"Elapsed: [{make_readable(round(utime.ticks_ms()/1000))}], Time: {time}, {data}\n")
+
+def summarise(everything:bool=False):
+    """
+    Saves a line for each repeated error whose window has ended, or for all of them when shutting down
+    """
+    for site, kind, count, first, last, first_time, last_time, message in errors.due(everything):
+        write("error.log", f"Elapsed: [{make_readable(round(last/1000))}], Time: {last_time}, {message}, {site} ({kind}) {count} more times since Elapsed: [{make_readable(round(first/1000))}], Time: {first_time}\n")
@@ -0,0 +1,269 @@
+import array
+from utime import ticks_ms, ticks_diff
+
+"""
+Edge capture for the anemometer
+
+Edges are timestamped by a backend as they happen (pin irq, hardware timer or a plain python feed) and pushed
+into a preallocated ring. The main loop drains the ring whenever it gets round to it, so a slow web request,
+display update or SD write no longer drops edges
+
+Capture modes (settings.ini [RPM] Capture Mode):
+timer - a hardware timer samples the ADC every 'Sample Period' ms (default)
+irq - a pin interrupt on the anemometer pin, only use if the sensor gives a clean digital signal
+poll - the old behaviour, the main loop reads the ADC once per pass
+"""
+
+EDGES_PER_ROTATION = 4 # 4 edges per rotation on my sensor
+
+class EdgeCapture:
+    """
+    Fixed size ring of edge timestamps (ms). Only the backend writes to it and only the main loop reads from it
+    so no lock is needed. Nothing in push() allocates so it is safe to call from an interrupt
+    """
+    def __init__(self, size=64):
+        self.size = size
+        self.times = array.array('L', [0]*size)
+        self.head = 0 # next slot to write
+        self.tail = 0 # next slot to read
+        self.dropped = 0 # edges lost because the ring was full
+
+    def push(self, t):
+        head = self.head + 1
+        if head == self.size: head = 0
+        if head == self.tail: # ring is full, main loop hasn't kept up
+            self.dropped += 1
+            return
+        self.times[self.head] = t
+        self.head = head
+
+    def pop(self) -> int:
+        """
+        Returns the oldest edge timestamp or -1 if there are no edges waiting
+        """
+        if self.tail == self.head: return -1
+        t = self.times[self.tail]
+        tail = self.tail + 1
+        self.tail = 0 if tail == self.size else tail
+        return t
+
+    def __len__(self):
+        return (self.head - self.tail) % self.size
+
+    def clear(self):
+        self.tail = self.head
+
+class FeedBackend:
+    """
+    Pure python backend, samples are fed in by hand. Used by the other sampling backends and on a host computer
+
+    Edges are found with hysteresis, the signal has to rise to 'rising' to go high and drop below 'falling'
+    to go low again, so noise around a single threshold can't cause double edges. The signal also has to stay
+    past the threshold for 'dwell' ms before the edge counts, a shorter excursion is treated as noise. The edge
+    is timestamped when the signal first crossed, and is only pushed once the next sample (or pin interrupt)
+    shows it stayed long enough
+    """
+    def __init__(self, capture, rising, falling=None, dwell=0, block=16):
+        self.capture = capture
+        self.rising = rising
+        self.falling = rising if falling is None else falling
+        self.dwell = dwell
+        self.high = False # signal is currently high
+        self.crossing = False # signal has crossed the threshold but not stayed past it for dwell yet
+        self.crossed = 0 # time it crossed
+        # preallocated block of samples, filled by the sampling backends and processed once full
+        self.block = block
+        self.values = array.array('H', [0]*block)
+        self.times = array.array('L', [0]*block)
+        self.index = 0
+
+    def feed(self, value, t):
+        if self.crossing and ticks_diff(t, self.crossed) >= self.dwell: self.edge() # stayed past until now
+        if self.high: past = value < self.falling
+        else: past = value >= self.rising
+        if not past:
+            self.crossing = False # back where it was before dwell was up, noise
+        elif not self.crossing:
+            self.crossing = True
+            self.crossed = t
+            if self.dwell <= 0: self.edge()
+
+    def edge(self):
+        self.high = not self.high
+        self.crossing = False
+        self.capture.push(self.crossed)
+
+    def sample(self, value, t):
+        """
+        Store a sample in the block, the block is checked for edges once it is full
+        """
+        i = self.index
+        self.values[i] = value
+        self.times[i] = t
+        i += 1
+        if i == self.block:
+            i = 0
+            self.feed_block(self.values, self.times)
+        self.index = i
+
+    def feed_block(self, values, times):
+        """
+        Runs from the timer's hard irq, so nothing here may allocate: min/max over an array and a while loop only
+        """
+        # min/max run in C, if the whole block is on one side of the band there can't be an edge in it
+        if not self.crossing:
+            if self.high:
+                if min(values) >= self.falling: return
+            elif max(values) < self.rising: return
+        i = 0
+        n = self.block
+        while i < n:
+            self.feed(values[i], times[i])
+            i += 1
+
+    def set_thresholds(self, rising, falling):
+        self.rising, self.falling = rising, falling
+
+    def poll(self): pass # samples arrive through feed()
+
+    def deinit(self): pass
+
+class PollBackend(FeedBackend):
+    """
+    Reads the ADC once every time poll() is called from the main loop
+    """
+    def __init__(self, capture, rising, falling, dwell, block, adc):
+        super().__init__(capture, rising, falling, dwell, block)
+        self.adc = adc
+
+    def poll(self):
+        self.sample(self.adc.read_u16(), ticks_ms())
+
+class TimerBackend(FeedBackend):
+    """
+    Samples the ADC from a hardware timer so sampling keeps going while the main loop is busy. The timer is hard so
+    the callback also runs during blocking C calls (the display over I2C, FatFs writes), a soft timer would wait for
+    them. Edge detection runs in the irq as well and none of it allocates
+    """
+    def __init__(self, capture, rising, falling, dwell, block, adc, period=1):
+        import machine, micropython
+        micropython.alloc_emergency_exception_buf(100) # lets an error in the irq be reported
+        super().__init__(capture, rising, falling, dwell, block)
+        self.adc = adc
+        self.timer = machine.Timer(period=period, mode=machine.Timer.PERIODIC, callback=self._sample, hard=True)
+
+    def _sample(self, timer):
+        self.sample(self.adc.read_u16(), ticks_ms())
+
+    def deinit(self):
+        self.timer.deinit()
+
+class IRQBackend(FeedBackend):
+    """
+    Timestamps edges with a pin interrupt on both rising and falling edges, the pin's own schmitt trigger
+    provides the hysteresis
+    """
+    def __init__(self, capture, dwell, pin):
+        import machine
+        super().__init__(capture, 1, 1, dwell, 1)
+        self.pin = pin
+        self.pin.init(machine.Pin.IN)
+        self.high = bool(self.pin.value())
+        self.pin.irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, handler=self._edge, hard=True)
+
+    def set_thresholds(self, rising, falling):
+        pass # fed pin levels of 0 or 1, so the ADC thresholds don't apply
+
+    def _edge(self, pin):
+        self.feed(pin.value(), ticks_ms())
+
+    def deinit(self):
+        self.pin.irq(handler=None)
+
+def create(mode, pin_num, rising, falling, dwell=0, period=1, block=16, size=64):
+    """
+    Sets up the edge capture ring and the backend for the given capture mode. Returns [capture, backend]
+    """
+    import machine
+    capture = EdgeCapture(size)
+    if mode == "irq":
+        backend = IRQBackend(capture, dwell, machine.Pin(pin_num))
+    elif mode == "poll":
+        backend = PollBackend(capture, rising, falling, dwell, block, machine.ADC(machine.Pin(pin_num)))
+    elif mode == "timer":
+        backend = TimerBackend(capture, rising, falling, dwell, block, machine.ADC(machine.Pin(pin_num)), period)
+    else:
+        raise ValueError(f"Unknown capture mode '{mode}'")
+    return [capture, backend]
+
+class IntervalRing:
+    """
+    Fixed size ring of the time between edges (ms) with a running total, adding an interval never allocates
+    """
+    def __init__(self, size=EDGES_PER_ROTATION):
+        self.size = size
+        self.intervals = array.array('L', [0]*size)
+        self.index = 0 # next slot to overwrite
+        self.count = 0 # number of valid intervals
+        self.total = 0 # sum of the valid intervals
+
+    def add(self, interval):
+        if self.count == self.size: self.total -= self.intervals[self.index] # drop the oldest interval
+        else: self.count += 1
+        self.intervals[self.index] = interval
+        self.total += interval
+        self.index += 1
+        if self.index == self.size: self.index = 0
+
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def clear(self):
+        self.index, self.count, self.total = 0, 0, 0
+
+class Anemometer:
+    """
+    Drains the edge capture ring and keeps track of rotations and rpm
+    """
+    def __init__(self, capture, backend, max_time_diff, timeout, window=EDGES_PER_ROTATION):
+        self.capture = capture
+        self.backend = backend
+        self.max_time_diff = max_time_diff
+        self.timeout = timeout
+        self.edge_times = IntervalRing(window) # rpm is averaged over this many edges
+        self.last_edge_time = 0
+        self.rotations = 0
+        self.rpm = 0
+
+    def calculate_rpm(self) -> float:
+        """
+        Calculates current rpm using the time taken between each edge
+        """
+        if not self.edge_times.full():
+            return 0
+        total_time = self.edge_times.total
+        if total_time > 0:
+            # window/4 rotations over total_time, 60000 milliseconds in a minute
+            self.rpm = 60000 * self.edge_times.size / (EDGES_PER_ROTATION * total_time)
+        return self.rpm
+
+    def update(self, current_time):
+        """
+        Consume every edge captured since the last call then check for timeout. Returns the current rpm
+        """
+        self.backend.poll()
+        while True:
+            t = self.capture.pop()
+            if t < 0: break
+            edge_time = ticks_diff(t, self.last_edge_time)
+            self.rotations += 1 / EDGES_PER_ROTATION
+            if edge_time < self.max_time_diff:
+                self.edge_times.add(edge_time)
+                self.rpm = self.calculate_rpm()
+            self.last_edge_time = t # update last_edge_time for every edge detection
+
+        # check for timeout
+        if ticks_diff(current_time, self.last_edge_time) > self.timeout:
+            self.rpm = 0
+            self.edge_times.clear()
+        return self.rpm
@@ -0,0 +1,114 @@
+"""
+Offline rpm accuracy and throughput benchmark
+
+Replays the synthetic waveforms in waveforms.py through anemometer.py (the same code the station runs) using the
+stand-ins in host.py, then reports the host cpu time per second of signal, edge count error and rpm error against
+the true rpm. The cpu time covers everything the station code does, the main loop passes and the timer/irq
+callbacks (which run inside clock.advance() and the pin handler), so the modes can be compared even though they
+split the work differently. Allocations aren't reported: CPython allocates for every int past 256 (every tick)
+where MicroPython doesn't, so a count on a computer can't tell the modes apart. The main loop is modelled as a
+pass every 'pass' ms that also stalls for the display update, data log and web requests, so changes to the
+thresholds, Max Time Diff or the loop can be compared before flashing them
+
+Modes:
+legacy - the original loop, one ADC read per pass with a single threshold
+poll - one ADC read per pass through the hysteresis detector
+timer - a hardware timer samples the ADC every 'sample period' ms, passes only drain the edge ring
+irq - a pin interrupt on every edge, the pin reads high above half scale
+
+Usage: python bench_rpm.py [--scenario noise] [--mode timer] [--duration 120000] [--falling 50000] ...
+"""
+import argparse, random, time
+import host
+host.install()
+import anemometer, waveforms
+
+def replay(mode, values, true_rpm, edges, args):
+    host.clock.reset()
+    if mode == "legacy":
+        capture, backend = anemometer.create("poll", 28, args.threshold, args.threshold, 0, args.sample_period, 1)
+    else:
+        capture, backend = anemometer.create(mode, 28, args.rising, args.falling, args.dwell, args.sample_period, args.block)
+    wind = anemometer.Anemometer(capture, backend, args.max_time_diff, args.timeout, args.average_edges)
+    adc = getattr(backend, "adc", None)
+    pin = getattr(backend, "pin", None)
+    rng = random.Random(args.seed)
+
+    busy = 0.0
+    errors, pct_errors = [], []
+    next_pass, next_display, next_log = 0, args.update_interval, args.log_interval
+    for t in range(len(values)):
+        value = values[t]
+        if adc: adc.value = value
+        level = int(value >= 32768)
+        start = time.perf_counter()
+        if pin and level != pin.value():
+            pin.value(level)
+            pin.handler(pin) # irq mode's detection
+        host.clock.advance(1) # timer mode's sampling and detection
+        now = host.clock.now
+        run = now >= next_pass
+        if run: rpm = wind.update(now) # one pass of the main loop
+        busy += time.perf_counter() - start
+        if not run: continue
+
+        stall = args.pass_ms
+        if now >= next_display:
+            next_display += args.update_interval
+            stall += args.display_ms
+            truth = true_rpm[t]
+            errors.append(abs(rpm - truth))
+            if truth >= 10: pct_errors.append(abs(rpm - truth) / truth * 100)
+        if now >= next_log:
+            next_log += args.log_interval
+            stall += args.log_ms
+        if rng.random() < args.web_rate * args.pass_ms / 1000: stall += args.web_ms
+        next_pass = now + stall
+    backend.deinit()
+
+    seen = round(wind.rotations * anemometer.EDGES_PER_ROTATION)
+    seconds = len(values) / 1000
+    return {
+        "cpu us/s": busy * 1e6 / seconds,
+        "edges": len(edges),
+        "seen": seen,
+        "edge err %": (seen - len(edges)) / len(edges) * 100 if edges else 0,
+        "dropped": capture.dropped,
+        "rpm MAE": sum(errors) / len(errors) if errors else 0,
+        "rpm MAPE %": sum(pct_errors) / len(pct_errors) if pct_errors else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(waveforms.SCENARIOS), help="default: all")
+    parser.add_argument("--mode", action="append", choices=["legacy", "poll", "timer", "irq"], help="default: legacy and timer")
+    parser.add_argument("--duration", type=int, default=120000, help="ms of signal per scenario")
+    parser.add_argument("--threshold", type=int, default=60000, help="legacy single threshold")
+    parser.add_argument("--rising", type=int, default=60000)
+    parser.add_argument("--falling", type=int, default=56000)
+    parser.add_argument("--dwell", type=int, default=2)
+    parser.add_argument("--block", type=int, default=16)
+    parser.add_argument("--sample-period", type=int, default=1)
+    parser.add_argument("--max-time-diff", type=int, default=4000)
+    parser.add_argument("--timeout", type=int, default=4000)
+    parser.add_argument("--average-edges", type=int, default=4)
+    parser.add_argument("--update-interval", type=int, default=1000)
+    parser.add_argument("--log-interval", type=int, default=600000)
+    parser.add_argument("--pass-ms", type=int, default=5, help="time between main loop passes")
+    parser.add_argument("--display-ms", type=int, default=25, help="stall for each display update")
+    parser.add_argument("--log-ms", type=int, default=150, help="stall for each data log")
+    parser.add_argument("--web-ms", type=int, default=60, help="stall for each web request")
+    parser.add_argument("--web-rate", type=float, default=0.5, help="web requests per second")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    columns = ["cpu us/s", "edges", "seen", "edge err %", "dropped", "rpm MAE", "rpm MAPE %"]
+    print(f"{'scenario':<10}{'mode':<8}" + "".join(f"{c:>14}" for c in columns))
+    for name in args.scenario or sorted(waveforms.SCENARIOS):
+        values, true_rpm, edges = waveforms.SCENARIOS[name](args.duration)
+        for mode in args.mode or ["legacy", "timer"]:
+            result = replay(mode, values, true_rpm, edges, args)
+            print(f"{name:<10}{mode:<8}" + "".join(f"{result[c]:>14.1f}" if isinstance(result[c], float) else f"{result[c]:>14}" for c in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+SD card block device benchmark
+
+Runs libraries/sdcard.py against the simulated card in sdcard_sim.py and reports, per operation, the commands sent
+to the card, bytes on the SPI bus and modelled time (bus time at the baudrate plus the driver's sleeps) for a few
+readblocks/writeblocks patterns, with and without sdcard.SectorCache.
+
+The SDsave rows model what FatFs does for each flush of the data log: find the file's directory entry, follow its
+cluster chain, read the partly filled last sector, write the new sectors, update the FAT (both copies) when a
+cluster is added, then write the directory entry and sync. The manifest is rewritten after every flush the same
+way. Numbers are per logged row so Flush Size, the cache and the baudrate can be compared
+
+Usage: python bench_sd.py [--baudrate 1320000 --baudrate 10000000] [--cache 8] [--rows 1000] [--row-bytes 160] ...
+"""
+import argparse
+import host
+host.install()
+import sdcard, sdcard_sim
+
+def open_card(args, baudrate):
+    card = sdcard_sim.SimCard(read_latency_us=args.read_latency, write_busy_us=args.write_busy, multi_busy_us=args.multi_busy)
+    sdcard.time = card # the driver's sleep_ms calls go to the card's clock
+    sd = sdcard.SDCard(card.spi, card.cs, baudrate)
+    card.reset_stats()
+    return card, sd
+
+class FatModel:
+    """
+    The block reads and writes FatFs makes for appends and rewrites, on a FAT32 layout with files allocated in
+    contiguous clusters
+    """
+    FSINFO, FAT, FATS, DIR, DATA = 1, 32, 2, 4096, 8192
+
+    def __init__(self, device, cluster=8, fat_size=2048):
+        self.device = device
+        self.cluster = cluster # sectors per cluster
+        self.fat_size = fat_size # sectors per FAT
+        self.files = {} # name: [size, first cluster]
+        self.next_cluster = 0
+        self.buf = bytearray(512)
+
+    def read(self, sector): self.device.readblocks(sector, self.buf)
+
+    def write(self, sector): self.device.writeblocks(sector, self.buf)
+
+    def fat_sector(self, cluster): return self.FAT + cluster // 128 # 128 FAT32 entries per sector
+
+    def update_fat(self, cluster):
+        self.read(self.fat_sector(cluster))
+        for i in range(self.FATS): self.write(self.fat_sector(cluster) + i * self.fat_size)
+
+    def append(self, name, size):
+        if name not in self.files:
+            self.files[name] = [0, self.next_cluster]
+            self.next_cluster += 64 # room to grow without fragmenting
+        entry = self.files[name]
+        self.read(self.DIR) # open, find the directory entry
+        clusters = (entry[0] + self.cluster * 512 - 1) // (self.cluster * 512)
+        for sector in sorted({self.fat_sector(entry[1] + c) for c in range(clusters)}): self.read(sector) # seek to the end
+        position, end = entry[0], entry[0] + size
+        while position < end:
+            sector = position // 512
+            if sector % self.cluster == 0 and position % 512 == 0: self.update_fat(entry[1] + sector // self.cluster) # new cluster
+            if position % 512: self.read(self.DATA + entry[1] * self.cluster + sector) # partly filled sector
+            self.write(self.DATA + entry[1] * self.cluster + sector)
+            position = min(end, (sector + 1) * 512)
+        entry[0] = end
+        self.read(self.DIR) # close, update the size in the directory entry
+        self.write(self.DIR)
+        self.write(self.FSINFO)
+        self.device.ioctl(3, 0)
+
+    def rewrite(self, name, size):
+        if name in self.files and self.files[name][0]:
+            self.read(self.DIR) # open with "w" truncates, freeing the clusters
+            self.update_fat(self.files[name][1])
+            self.files[name][0] = 0
+        self.append(name, size)
+
+PATTERNS = {
+    # name: (read?, blocks per call, list of starting blocks)
+    "read 1 sequential": (True, 1, list(range(64))),
+    "read 8 sequential": (True, 8, list(range(0, 64, 8))),
+    "read 1 same sector": (True, 1, [32] * 64),
+    "write 1 sequential": (False, 1, list(range(64))),
+    "write 8 sequential": (False, 8, list(range(0, 64, 8))),
+    "write 1 same sector": (False, 1, [32] * 64),
+}
+
+def run_pattern(args, baudrate, cache, pattern):
+    card, sd = open_card(args, baudrate)
+    device = sdcard.SectorCache(sd, cache) if cache else sd
+    read, count, starts = PATTERNS[pattern]
+    buf = bytearray(512 * count)
+    for block in starts:
+        if read: device.readblocks(block, buf)
+        else: device.writeblocks(block, buf)
+    if cache: device.ioctl(3, 0)
+    return card, len(starts)
+
+def run_sdsave(args, baudrate, cache):
+    card, sd = open_card(args, baudrate)
+    device = sdcard.SectorCache(sd, cache) if cache else sd
+    fat = FatModel(device)
+    buffered = 0
+    for _ in range(args.rows):
+        buffered += args.row_bytes
+        if buffered >= args.flush_size:
+            fat.append("data/segment.csv", buffered)
+            fat.rewrite("data/manifest.csv", args.manifest_bytes)
+            buffered = 0
+    return card, args.rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baudrate", type=int, action="append", help="default: 1320000 (the driver's default) and 10000000")
+    parser.add_argument("--cache", type=int, default=8, help="SectorCache size to compare against no cache")
+    parser.add_argument("--rows", type=int, default=1000, help="data log rows for the SDsave rows")
+    parser.add_argument("--row-bytes", type=int, default=160)
+    parser.add_argument("--flush-size", type=int, default=512)
+    parser.add_argument("--manifest-bytes", type=int, default=100)
+    parser.add_argument("--read-latency", type=int, default=250, help="us before each read block")
+    parser.add_argument("--write-busy", type=int, default=1000, help="us busy after a single block write")
+    parser.add_argument("--multi-busy", type=int, default=400, help="us busy after each block of a multi block write")
+    args = parser.parse_args()
+
+    columns = ["commands/op", "bytes/op", "ms/op"]
+    print(f"{'pattern':<22}{'baudrate':>10}{'cache':>7}" + "".join(f"{c:>14}" for c in columns))
+    for baudrate in args.baudrate or [1320000, 10000000]:
+        for pattern in list(PATTERNS) + ["SDsave row"]:
+            for cache in (0, args.cache):
+                if pattern == "SDsave row": card, ops = run_sdsave(args, baudrate, cache)
+                else: card, ops = run_pattern(args, baudrate, cache, pattern)
+                result = [sum(card.commands.values()) / ops, card.bytes / ops, card.total_us / ops / 1000]
+                print(f"{pattern:<22}{baudrate:>10}{cache:>7}" + "".join(f"{v:>14.2f}" for v in result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Binary format round trip check
+
+Packs data log records (records.py) and hourly/daily rollups (rollups.py) and unpacks them again, checking that
+zero, missing, negative and out of range values come back as they went in (or clamped to the field's limits). Run
+after changing FIELDS, LIMITS or MISSING
+
+Usage: python check_formats.py
+"""
+import host
+host.install()
+import records, rollups
+
+TIME = (2026, 10, 18, 12, 0, 0)
+
+def close(a, b, scale) -> bool:
+    if a is None or b is None: return a is b
+    return abs(a - b) <= 0.5 / scale
+
+def check_records():
+    cases = {
+        "zero": [0] * len(records.FIELDS),
+        "missing": [None] * len(records.FIELDS),
+        "negative temperature": [0, 0, 0, -12.5, 50] + [0] * 4 + [-20.1, -3.0, -10.2] + [0] * 5,
+    }
+    for name, values in cases.items():
+        time, back = records.unpack(records.pack(records.epoch(TIME), values))
+        assert time == TIME, (name, time)
+        for field, a, b in zip(records.FIELDS, values, back):
+            assert close(a, b, field[2]), (name, field[0], a, b)
+    # values past the limits are clamped, never turned into a missing value
+    for field in records.FIELDS:
+        low, high = records.LIMITS[field[1]]
+        for value, limit in ((1e12, high), (-1e12, low)):
+            values = [0] * len(records.FIELDS)
+            values[records.FIELDS.index(field)] = value
+            back = records.unpack(records.pack(records.epoch(TIME), values))[1][records.FIELDS.index(field)]
+            assert back == limit / field[2], (field[0], value, back)
+
+def check_rollups():
+    calm = [0, 0, 0] + [None] * (len(records.FIELDS) - 3) # no wind and no temperature/humidity readings
+    rollup = rollups.Rollup(3600)
+    rollup.reset(records.epoch(TIME))
+    rollup.add(calm)
+    start, values = rollups.unpack(rollup.pack())
+    assert start == rollup.start, start
+    assert values == [0, 0, 0, None, None, None, None, 1], values
+    rollup.add([12.5, 8.25, 30.5, -4.5, 60] + [0] * 4 + [-5.0, -4.0, -4.5, 55, 62, 58] + [None] * 2)
+    start, values = rollups.unpack(rollup.pack())
+    for field, a, b in zip(rollups.FIELDS, rollup.values(), values):
+        assert close(a, b, field[2]), (field[0], a, b)
+
+if __name__ == "__main__":
+    check_records()
+    check_rollups()
+    print("ok")
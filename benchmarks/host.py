@@ -0,0 +1,99 @@
+"""
+Stand-ins for the MicroPython modules the station imports, so the station code can run on a host computer
+
+Time is virtual, nothing happens until the benchmark moves the clock forward with clock.advance(). Hardware
+timers created through the fake machine.Timer fire as the clock passes their period, and the fake ADC returns
+whatever value the benchmark last gave it
+"""
+import asyncio, os, sys, types
+
+class Clock:
+    def __init__(self):
+        self.now = 0 # ms
+        self.timers = []
+
+    def reset(self):
+        self.now = 0
+        self.timers.clear()
+
+    def ticks_ms(self): return self.now
+
+    def ticks_us(self): return self.now * 1000
+
+    def advance(self, ms=1):
+        """
+        Move time forward 1 ms at a time, firing any timers that are due
+        """
+        for _ in range(ms):
+            self.now += 1
+            for timer in self.timers:
+                if timer.callback and self.now >= timer.next_fire:
+                    timer.next_fire += timer.period
+                    timer.callback(timer)
+
+clock = Clock()
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = 0
+        self.reads = 0
+
+    def read_u16(self):
+        self.reads += 1
+        return self.value
+
+class Pin:
+    IN, OUT, OPEN_DRAIN = 0, 1, 2
+    IRQ_RISING, IRQ_FALLING = 1, 2
+    def __init__(self, id, mode=None, value=0):
+        self.id = id
+        self._value = value
+        self.handler = None
+
+    def init(self, mode=None, value=None): pass
+
+    def value(self, v=None):
+        if v is None: return self._value
+        self._value = v
+
+    def irq(self, trigger=0, handler=None, hard=False):
+        self.handler = handler
+
+class Timer:
+    PERIODIC, ONE_SHOT = 1, 0
+    def __init__(self, period=1000, mode=PERIODIC, callback=None, hard=False):
+        self.period = period
+        self.callback = callback
+        self.next_fire = clock.now + period
+        clock.timers.append(self)
+
+    def deinit(self):
+        self.callback = None
+        if self in clock.timers: clock.timers.remove(self)
+
+def install():
+    """
+    Put the fake machine, utime and micropython modules (and asyncio as uasyncio) in sys.modules, call before
+    importing any station code
+    """
+    machine = types.ModuleType("machine")
+    machine.ADC, machine.Pin, machine.Timer = ADC, Pin, Timer
+    utime = types.ModuleType("utime")
+    utime.ticks_ms = clock.ticks_ms
+    utime.ticks_us = clock.ticks_us
+    utime.ticks_diff = lambda new, old: new - old
+    utime.ticks_add = lambda ticks, delta: ticks + delta
+    utime.sleep_ms = clock.advance
+    utime.sleep = lambda s: clock.advance(int(s * 1000))
+    micropython = types.ModuleType("micropython")
+    micropython.const = lambda value: value
+    micropython.alloc_emergency_exception_buf = lambda size: None
+    sys.modules["machine"] = machine
+    sys.modules["utime"] = utime
+    sys.modules["micropython"] = micropython
+    sys.modules["uasyncio"] = asyncio
+    # the station code lives in the folder above this one, the drivers in its libraries folder
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for path in (os.path.join(root, "libraries"), root):
+        if path not in sys.path: sys.path.insert(0, path)
@@ -0,0 +1,190 @@
+"""
+RAM backed SD card that talks SPI, so libraries/sdcard.py can run on a host computer
+
+The card answers the commands and tokens SDCard uses (CMD0/8/9/12/16/17/18/24/25/55/58, ACMD41, data, multi
+block and stop tokens) one byte at a time the way a real card does in SPI mode, including the wait before a read
+block and the busy signal after a write. Every byte on the bus is counted and turned into modelled bus time from
+the baudrate SDCard sets, and the driver's sleep_ms calls are added on top, so I/O changes can be compared without
+hardware. It is a v2 SDHC card (block addressing)
+
+Usage:
+card = sdcard_sim.SimCard()
+sdcard.time = card # the driver's sleep_ms calls go to the card's clock
+sd = sdcard.SDCard(card.spi, card.cs)
+card.reset_stats()
+"""
+from collections import deque
+
+_TOKEN_CMD25, _TOKEN_STOP_TRAN, _TOKEN_DATA = 0xFC, 0xFD, 0xFE
+
+class SimSPI:
+    """
+    The SPI bus as SDCard sees it, every byte sent out is exchanged for one from the card
+    """
+    def __init__(self, card):
+        self.card = card
+
+    def init(self, baudrate=1000000, **kwargs): self.card.baudrate = baudrate
+
+    def write(self, buf):
+        for byte in buf: self.card.exchange(byte)
+
+    def read(self, n, fill=0):
+        return bytes(self.card.exchange(fill) for _ in range(n))
+
+    def readinto(self, buf, fill=0):
+        for i in range(len(buf)): buf[i] = self.card.exchange(fill)
+
+    def write_readinto(self, out, buf):
+        for i in range(len(buf)): buf[i] = self.card.exchange(out[i])
+
+class SimPin:
+    """
+    Chip select, the card only listens while it is low
+    """
+    OUT = 1
+    def __init__(self, card):
+        self.card = card
+
+    def init(self, mode=None, value=1): self.card.selected = not value
+
+    def __call__(self, value): self.card.selected = not value
+
+class SimCard:
+    def __init__(self, sectors=1 << 21, read_latency_us=250, write_busy_us=1000, multi_busy_us=400, stop_busy_us=1000, init_polls=3):
+        self.sectors = sectors # 1 GB by default
+        self.read_latency_us = read_latency_us # wait before each read block
+        self.write_busy_us = write_busy_us # busy after a single block write
+        self.multi_busy_us = multi_busy_us # busy after each block of a multi block write
+        self.stop_busy_us = stop_busy_us # busy after the stop token
+        self.init_polls = init_polls # ACMD41s before the card is ready
+        self.blocks = {} # sector: bytes, unwritten sectors read as zeros
+        self.spi = SimSPI(self)
+        self.cs = SimPin(self)
+        self.baudrate = 100000
+        self.selected = False
+        self.idle = True
+        self.acmd41s = 0
+        self.out = deque() # bytes the card will send next, a wait is one [byte, count] item
+        self.frame = bytearray() # command being received
+        self.state = "command" # command, read multi, wait token, data in
+        self.write_mode = 0 # 24 or 25 while writing
+        self.rx = bytearray()
+        self.next_block = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.bytes = 0 # bytes on the bus
+        self.bus_us = 0.0
+        self.sleep_us = 0
+        self.commands = {} # command number: count
+        self.blocks_read = 0
+        self.blocks_written = 0
+
+    def sleep_ms(self, ms):
+        """
+        The card gets on with what it is waiting on while the driver sleeps, so the time comes off the next wait
+        """
+        self.sleep_us += ms * 1000
+        for item in self.out:
+            if isinstance(item, list):
+                item[1] -= ms * self.baudrate // 8000
+                if item[1] <= 0: self.out.remove(item)
+                break
+
+    @property
+    def total_us(self): return self.bus_us + self.sleep_us
+
+    def _wait(self, us, byte):
+        # a wait of us microseconds is this many bytes at the current baudrate
+        self.out.append([byte, max(1, round(us * self.baudrate / 8000000))])
+
+    def _queue_block(self, block):
+        self._wait(self.read_latency_us, 0xFF)
+        self.out.append(_TOKEN_DATA)
+        self.out.extend(self.blocks.get(block, bytes(512)))
+        self.out.extend(b"\x00\x00") # crc, not checked by the driver
+        self.blocks_read += 1
+
+    def exchange(self, mosi):
+        self.bytes += 1
+        self.bus_us += 8000000 / self.baudrate
+        if not self.selected: return 0xFF
+        if not self.out and self.state == "read multi": self._queue_block(self._advance())
+        miso = 0xFF
+        if self.out:
+            miso = self.out[0]
+            if isinstance(miso, list): # part way through a wait
+                miso[1] -= 1
+                if not miso[1]: self.out.popleft()
+                miso = miso[0]
+            else: self.out.popleft()
+
+        if self.state == "data in":
+            self.rx.append(mosi)
+            if len(self.rx) == 514: # block and crc
+                self.blocks[self.next_block] = bytes(self.rx[:512])
+                self.blocks_written += 1
+                self.next_block += 1
+                self.out.append(0x05) # data accepted
+                self._wait(self.write_busy_us if self.write_mode == 24 else self.multi_busy_us, 0x00)
+                self.state = "command" if self.write_mode == 24 else "wait token"
+        elif self.state == "wait token":
+            if (mosi == _TOKEN_DATA and self.write_mode == 24) or (mosi == _TOKEN_CMD25 and self.write_mode == 25):
+                self.rx = bytearray()
+                self.state = "data in"
+            elif mosi == _TOKEN_STOP_TRAN and self.write_mode == 25:
+                self.out.append(0xFF)
+                self._wait(self.stop_busy_us, 0x00)
+                self.state = "command"
+        elif self.frame or mosi & 0xC0 == 0x40: # command frame, also listened for while streaming CMD18 blocks
+            self.frame.append(mosi)
+            if len(self.frame) == 6:
+                self._command(self.frame[0] & 0x3F, int.from_bytes(self.frame[1:5], "big"))
+                self.frame = bytearray()
+        return miso
+
+    def _advance(self):
+        block = self.next_block
+        self.next_block += 1
+        return block
+
+    def _command(self, cmd, arg):
+        self.commands[cmd] = self.commands.get(cmd, 0) + 1
+        r1 = 0x01 if self.idle else 0x00
+        if self.state == "read multi" and cmd != 12: r1 = 0x04 # only CMD12 is allowed while streaming
+        self.out.clear()
+        self.out.append(0xFF) # the card takes a byte before it answers
+        if cmd == 0:
+            self.idle, self.acmd41s, self.state = True, 0, "command"
+            self.out.append(0x01)
+        elif cmd == 8: self.out.extend(bytes([r1, 0x00, 0x00, 0x01, 0xAA]))
+        elif cmd == 55: self.out.append(r1)
+        elif cmd == 41: # ACMD41
+            self.acmd41s += 1
+            if self.acmd41s >= self.init_polls: self.idle = False
+            self.out.append(0x01 if self.idle else 0x00)
+        elif cmd == 58: self.out.extend(bytes([r1, 0xC0, 0xFF, 0x80, 0x00])) # powered up, block addressed
+        elif cmd == 9: # CSD version 2.0
+            csd = bytearray(16)
+            csd[0] = 0x40
+            size = self.sectors // 1024 - 1
+            csd[7], csd[8], csd[9] = size >> 16 & 0x3F, size >> 8 & 0xFF, size & 0xFF
+            self.out.extend(bytes([r1, 0xFF, _TOKEN_DATA]) + csd + b"\x00\x00")
+        elif cmd == 16: self.out.append(r1)
+        elif cmd == 17:
+            self.out.append(r1)
+            self._queue_block(arg)
+        elif cmd == 18:
+            self.out.append(r1)
+            self.next_block = arg
+            self.state = "read multi"
+        elif cmd == 12:
+            self.state = "command"
+            self.out.extend(b"\xff\x00")
+        elif cmd in (24, 25):
+            self.out.append(r1)
+            self.next_block = arg
+            self.write_mode = cmd
+            self.state = "wait token"
+        else: self.out.append(r1 | 0x04) # illegal command
@@ -0,0 +1,50 @@
+"""
+Synthetic anemometer waveforms with known ground truth
+
+A waveform gives the true rpm at any time (ms). Simulate() turns it into 1 sample per ms of ADC values, the
+true rpm and the true edge times, 4 edges per rotation like the real sensor
+"""
+import math, random
+
+LOW, HIGH = 2000, 63500 # ADC values for the sensor's low and high output
+
+def constant(rpm=300):
+    return lambda t: rpm
+
+def ramp(start=0, end=1200, duration=120000):
+    return lambda t: start + (end - start) * min(t, duration) / duration
+
+def gusts(base=200, peak=1000, every=15000, length=3000):
+    return lambda t: peak if t % every < length else base
+
+def sine(mean=500, amplitude=300, period=20000):
+    return lambda t: mean + amplitude * math.sin(2 * math.pi * t / period)
+
+def simulate(rpm, duration, noise=0, dropouts=None, seed=1):
+    """
+    Returns (values, true_rpm, edges), values and true_rpm have one entry per ms. dropouts is a list of
+    (start, end) ms where the signal is stuck low, edges in a dropout can't be seen so aren't in edges
+    """
+    rng = random.Random(seed)
+    values, true_rpm, edges = [], [], []
+    phase = 0 # edges passed, 4 per rotation
+    for t in range(duration):
+        r = max(0, rpm(t))
+        last = int(phase)
+        phase += r * 4 / 60000
+        dropped = dropouts and any(start <= t < end for start, end in dropouts)
+        if int(phase) != last and not dropped: edges.append(t)
+        value = LOW if dropped or int(phase) % 2 == 0 else HIGH
+        if noise: value = int(value + rng.gauss(0, noise))
+        values.append(min(65535, max(0, value)))
+        true_rpm.append(r)
+    return values, true_rpm, edges
+
+SCENARIOS = {
+    "constant": lambda d: simulate(constant(300), d),
+    "ramp": lambda d: simulate(ramp(0, 1200, d), d),
+    "gusts": lambda d: simulate(gusts(), d),
+    "noise": lambda d: simulate(constant(400), d, noise=2500),
+    "dropout": lambda d: simulate(constant(300), d, dropouts=[(s, s + 2000) for s in range(5000, d, 10000)]),
+    "sine": lambda d: simulate(sine(), d, noise=800),
+}
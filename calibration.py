@@ -0,0 +1,71 @@
+import array
+
+"""
+RPM to wind speed calibration
+
+settings.ini [Calibration] takes either a list of rpm:speed points (straight lines between them) or polynomial
+coefficients (speed = c0 + c1*rpm + c2*rpm^2 ...). Either way it is compiled into an evenly spaced lookup table
+at startup, so converting is just an index and one interpolation
+"""
+
+class Calibration:
+    def __init__(self, points=None, coefficients=None, step=10, max_rpm=3000, units="m/s"):
+        if points: fn = lambda rpm: interpolate(points, rpm)
+        elif coefficients: fn = lambda rpm: polynomial(coefficients, rpm)
+        else: raise ValueError("Calibration needs points or coefficients")
+        self.step = step
+        self.units = units
+        self.size = max_rpm // step + 1
+        self.table = array.array('f', [fn(i * step) for i in range(self.size)])
+
+    def speed(self, rpm) -> float:
+        """
+        Returns the wind speed for the given rpm, past the end of the table the last two entries are extended
+        """
+        if rpm <= 0: return self.table[0]
+        pos = rpm / self.step
+        i = int(pos)
+        if i >= self.size - 1: i = self.size - 2
+        low = self.table[i]
+        return low + (self.table[i+1] - low) * (pos - i)
+
+def interpolate(points, rpm) -> float:
+    """
+    Straight lines between sorted (rpm, speed) points, extended past either end
+    """
+    if len(points) == 1: return points[0][1]
+    for i in range(1, len(points) - 1):
+        if rpm < points[i][0]: break
+    else: i = len(points) - 1
+    (r0, s0), (r1, s1) = points[i-1], points[i]
+    return s0 + (s1 - s0) * (rpm - r0) / (r1 - r0)
+
+def polynomial(coefficients, rpm) -> float:
+    speed = 0
+    for c in reversed(coefficients): speed = speed * rpm + c
+    return speed
+
+def parse_points(text) -> list:
+    """
+    '0:0, 100:2.1, 500:9.8' -> [(0.0, 0.0), (100.0, 2.1), (500.0, 9.8)]
+    """
+    points = []
+    for pair in text.split(","):
+        rpm, speed = pair.split(":")
+        points.append((float(rpm), float(speed)))
+    points.sort()
+    return points
+
+def from_config(config):
+    """
+    Build the calibration from settings.ini, returns None if there is no [Calibration] section
+    """
+    if "Calibration" not in config.config: return None
+    points = config.get("Calibration", "Points")
+    coefficients = config.get("Calibration", "Coefficients")
+    return Calibration(
+        points=parse_points(points) if points else None,
+        coefficients=[float(c) for c in coefficients.split(",")] if coefficients else None,
+        step=config.getint("Calibration", "Table Step", "10"),
+        max_rpm=config.getint("Calibration", "Table Max", "3000"),
+        units=config.get("Calibration", "Units", "m/s"))
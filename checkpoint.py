@@ -0,0 +1,78 @@
+import struct
+
+"""
+Interval checkpoint
+
+The running totals for the current log interval (rotations, the rpm/temperature/humidity/speed stats and the open
+hourly and daily rollups) are saved every Checkpoint Interval and after every log into one preallocated 512 byte
+file, so a reset part way through an interval loses at most a checkpoint's worth of data. On boot the file is read
+back with a single block read and the interval carries on where it left off.
+
+header: 4s magic b"WSCP", B version, B number of values, H reserved, I saved at, I interval start, I hourly start,
+I daily start (all seconds since 1970)
+then the values as floats and a checksum of everything before it
+"""
+
+PATH = "checkpoint.bin"
+SIZE = 512 # one block
+MAGIC = b"WSCP"
+VERSION = 1
+HEADER = "<4sBBHIIII"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+buf = bytearray(SIZE)
+
+def checksum(data) -> int:
+    """
+    Fletcher-32 over the bytes, plenty to catch a torn or half written block
+    """
+    a, b = 0, 0
+    for byte in data:
+        a = (a + byte) % 65535
+        b = (b + a) % 65535
+    return b << 16 | a
+
+def save(seconds:int, interval_start:int, rotations, stats:list, rollups:list):
+    """
+    Writes the checkpoint over the old one in place, rollups are (hourly, daily)
+    """
+    values = [rotations]
+    for s in stats: values += s.state()
+    for r in rollups: values += r.state()
+    struct.pack_into(HEADER, buf, 0, MAGIC, VERSION, len(values), 0, seconds, interval_start, rollups[0].start, rollups[1].start)
+    struct.pack_into(f"<{len(values)}f", buf, HEADER_SIZE, *values)
+    end = HEADER_SIZE + 4 * len(values)
+    struct.pack_into("<I", buf, end, checksum(memoryview(buf)[:end]))
+    try: file = open(PATH, "r+b") # overwrite in place, the file never changes size
+    except OSError: file = open(PATH, "wb")
+    with file: file.write(buf)
+
+def load(stats:list, rollups:list):
+    """
+    Restores the rollups and returns (saved at, interval start, rotations, stats values) for the caller to decide
+    whether the interval can carry on, see restore(). None if there is no valid checkpoint
+    """
+    try:
+        with open(PATH, "rb") as file:
+            if file.readinto(buf) != SIZE: return None
+    except OSError: return None
+    magic, version, count, _, seconds, interval_start, hourly, daily = struct.unpack_from(HEADER, buf)
+    expected = 1 + sum(s.state_size() for s in stats) + len(rollups) * rollups[0].STATE_SIZE
+    if magic != MAGIC or version != VERSION or count != expected: return None # from an older version or empty
+    end = HEADER_SIZE + 4 * count
+    if struct.unpack_from("<I", buf, end)[0] != checksum(memoryview(buf)[:end]): return None
+    values = struct.unpack_from(f"<{count}f", buf, HEADER_SIZE)
+    position = count - len(rollups) * rollups[0].STATE_SIZE
+    for rollup, start in zip(rollups, (hourly, daily)):
+        rollup.restore(start, values[position:position + rollup.STATE_SIZE])
+        position += rollup.STATE_SIZE
+    return seconds, interval_start, values[0], values[1:]
+
+def restore(stats:list, values):
+    """
+    Puts the saved interval stats back, values is the last item load() returned
+    """
+    position = 0
+    for s in stats:
+        s.restore(values[position:position + s.state_size()])
+        position += s.state_size()
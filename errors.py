@@ -0,0 +1,70 @@
+from utime import ticks_ms, ticks_diff
+
+"""
+Error coalescing
+
+A loose sensor wire makes the same error happen every reading. Only the first error from each site (the
+description passed to SDsave.error) and type is written straight away, repeats within Error Window are counted
+and written as one summary line when the window ends. At most Max Error Lines new errors are written per window,
+anything past that also goes into the summaries. The last few errors are kept in RAM for the /errors page
+
+Usage:
+if errors.add(e, "Error reading temperature and humidity", time): write the line
+for summary in errors.due(): write a summary line
+"""
+
+window = 60000 # ms
+max_lines = 10 # new error lines per window
+RECENT = 16
+recent = [None] * RECENT # (ticks, site, type, message, time), a ring of the latest errors, first core only
+recent_count = 0 # errors added since starting, the next one goes in recent[recent_count % RECENT]
+open_errors = {} # (site, type): [not written, first ticks, last ticks, first time, last time, last message]
+lines = 0 # lines written this window
+window_start = ticks_ms()
+
+def add(error, site:str, time:str='N/A') -> bool:
+    """
+    Records an error, returns True if it should be written now or False if it will be counted in a summary
+    """
+    global recent_count, lines, window_start
+    now = ticks_ms()
+    kind = type(error).__name__
+    message = str(error)
+    recent[recent_count % RECENT] = (now, site, kind, message, time)
+    recent_count += 1
+    if ticks_diff(now, window_start) >= window: window_start, lines = now, 0
+    entry = open_errors.get((site, kind))
+    if entry is None:
+        write = lines < max_lines
+        if write: lines += 1
+        open_errors[(site, kind)] = [0 if write else 1, now, now, time, time, message]
+        return write
+    entry[0] += 1
+    entry[2], entry[4], entry[5] = now, time, message
+    return False
+
+def due(everything=False) -> list:
+    """
+    Closes errors whose window has ended (or all of them) and returns a summary of each that wasn't fully written:
+    (site, type, not written, first ticks, last ticks, first time, last time, last message)
+    """
+    now = ticks_ms()
+    summaries = []
+    for key in list(open_errors):
+        entry = open_errors[key]
+        if everything or ticks_diff(now, entry[1]) >= window:
+            del open_errors[key]
+            if entry[0]: summaries.append(key + tuple(entry))
+    return summaries
+
+def report() -> str:
+    """
+    Latest errors, newest first, and the repeats waiting for a summary for the /errors page
+    """
+    out = [f"{recent_count} errors since starting"]
+    for i in range(min(recent_count, RECENT)):
+        ticks, site, kind, message, time = recent[(recent_count - 1 - i) % RECENT]
+        out.append(f"{ticks}ms {time} {site} {kind}: {message}")
+    for (site, kind), entry in open_errors.items():
+        if entry[0]: out.append(f"waiting {site} {kind} x{entry[0]} since {entry[1]}ms")
+    return "\n".join(out) + "\n"
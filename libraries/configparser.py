@@ -17,6 +17,8 @@ class ConfigParser:
             with open(filename, 'r') as file:
                 for line in file:
                     line = line.strip()
+                    if line.startswith('#') or line.startswith(';'):
+                        continue
                     if line.startswith('[') and line.endswith(']'):
                         current_section = line[1:-1].strip()
                         self.config[current_section] = {}
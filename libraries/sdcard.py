@@ -28,6 +28,7 @@ import time
 
 
 _CMD_TIMEOUT = const(150)
+_SPIN_POLLS = const(100)
 
 _R1_IDLE_STATE = const(1 << 0)
 # R1_ERASE_RESET = const(1 << 1)
@@ -153,10 +154,10 @@ class SDCard:
         # create and send the command
         buf = self.cmdbuf
         buf[0] = 0x40 | cmd
-        buf[1] = arg >> 24
-        buf[2] = arg >> 16
-        buf[3] = arg >> 8
-        buf[4] = arg
+        buf[1] = arg >> 24 & 0xFF
+        buf[2] = arg >> 16 & 0xFF
+        buf[3] = arg >> 8 & 0xFF
+        buf[4] = arg & 0xFF
         buf[5] = crc
         self.spi.write(buf)
 
@@ -189,11 +190,14 @@ class SDCard:
         self.cs(0)
 
         # read until start byte (0xff)
-        for i in range(_CMD_TIMEOUT):
+        # poll without sleeping first as the token usually arrives within a few hundred microseconds, then
+        # back off to 1ms polls so the overall timeout stays the same
+        for i in range(_SPIN_POLLS + _CMD_TIMEOUT):
             self.spi.readinto(self.tokenbuf, 0xFF)
             if self.tokenbuf[0] == _TOKEN_DATA:
                 break
-            time.sleep_ms(1)
+            if i >= _SPIN_POLLS:
+                time.sleep_ms(1)
         else:
             self.cs(1)
             raise OSError("timeout waiting for response")
@@ -294,8 +298,143 @@ class SDCard:
                 nblocks -= 1
             self.write_token(_TOKEN_STOP_TRAN)
 
+    def writesectors(self, block_num, bufs):
+        # write a list of 512 byte buffers to consecutive blocks, more than one is sent with a single CMD25
+        if len(bufs) == 1:
+            return self.writeblocks(block_num, bufs[0])
+        if self.cmd(25, block_num * self.cdv, 0) != 0:
+            raise OSError(5)  # EIO
+        for buf in bufs:
+            self.write(_TOKEN_CMD25, buf)
+        self.write_token(_TOKEN_STOP_TRAN)
+
     def ioctl(self, op, arg):
         if op == 4:  # get number of blocks
             return self.sectors
         if op == 5:  # get block size in bytes
-            return 512
\ No newline at end of file
+            return 512
+
+
+class SectorCache:
+    """
+    Write-back LRU sector cache in front of an SDCard, mount it instead of the card:
+
+        sd = sdcard.SectorCache(sdcard.SDCard(spi, cs), 8)
+        os.mount(os.VfsFat(sd), '/sd')
+
+    FatFs reads and rewrites the same FAT and directory sectors for every small append, with the cache those
+    stay in RAM until FatFs syncs (ioctl 3, sent when a file is flushed or closed). Dirty sectors next to each
+    other are then written with one CMD25. Single block reads are cached, multi block reads and writes bigger
+    than the cache go straight to the card.
+    """
+
+    def __init__(self, card, size=8):
+        self.card = card
+        self.size = size
+        self.bufs = [bytearray(512) for _ in range(size)]
+        self.blocks = [-1] * size  # block held by each slot, -1 for empty
+        self.dirty = [False] * size
+        self.used = [0] * size  # when each slot was last used, the lowest is evicted
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.commands = 0  # read/write commands sent to the card
+
+    def _find(self, block_num):
+        for i in range(self.size):
+            if self.blocks[i] == block_num:
+                self.clock += 1
+                self.used[i] = self.clock
+                return i
+        return -1
+
+    def _dirty_slot(self, block_num):
+        for i in range(self.size):
+            if self.blocks[i] == block_num and self.dirty[i]:
+                return i
+        return -1
+
+    def _take(self, block_num):
+        # reuse the least recently used slot, writing it out first if it is dirty
+        i = 0
+        for j in range(1, self.size):
+            if self.used[j] < self.used[i]:
+                i = j
+        if self.dirty[i]:
+            self._write_run(i)
+        self.blocks[i] = block_num
+        self.clock += 1
+        self.used[i] = self.clock
+        return i
+
+    def _write_run(self, i):
+        # write dirty slot i together with any dirty sectors directly before and after it
+        first = last = self.blocks[i]
+        while self._dirty_slot(first - 1) >= 0:
+            first -= 1
+        while self._dirty_slot(last + 1) >= 0:
+            last += 1
+        bufs = []
+        for block_num in range(first, last + 1):
+            j = self._dirty_slot(block_num)
+            bufs.append(self.bufs[j])
+            self.dirty[j] = False
+        self.commands += 1
+        try:
+            self.card.writesectors(first, bufs)
+        except OSError:
+            for block_num in range(first, last + 1):  # still not on the card, try again on the next sync
+                self.dirty[self._find(block_num)] = True
+            raise
+
+    def sync(self):
+        for i in range(self.size):
+            if self.dirty[i]:
+                self._write_run(i)
+
+    def readblocks(self, block_num, buf):
+        nblocks = len(buf) // 512
+        if nblocks == 1:
+            i = self._find(block_num)
+            if i >= 0:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.commands += 1
+                i = self._take(block_num)
+                try:
+                    self.card.readblocks(block_num, self.bufs[i])
+                except OSError:
+                    self.blocks[i] = -1
+                    raise
+            buf[:] = self.bufs[i]
+        else:
+            self.commands += 1
+            self.card.readblocks(block_num, buf)
+            mv = memoryview(buf)
+            for i in range(self.size):  # dirty sectors are newer than the card
+                offset = self.blocks[i] - block_num
+                if self.dirty[i] and 0 <= offset < nblocks:
+                    mv[offset * 512 : offset * 512 + 512] = self.bufs[i]
+
+    def writeblocks(self, block_num, buf):
+        nblocks = len(buf) // 512
+        if nblocks > self.size:
+            for i in range(self.size):  # drop the cached copies this replaces
+                if 0 <= self.blocks[i] - block_num < nblocks:
+                    self.blocks[i], self.dirty[i], self.used[i] = -1, False, 0
+            self.commands += 1
+            self.card.writeblocks(block_num, buf)
+            return
+        mv = memoryview(buf)
+        for n in range(nblocks):
+            i = self._find(block_num + n)
+            if i < 0:
+                i = self._take(block_num + n)
+            self.bufs[i][:] = mv[n * 512 : n * 512 + 512]
+            self.dirty[i] = True
+
+    def ioctl(self, op, arg):
+        if op == 2 or op == 3:  # deinit, sync
+            self.sync()
+        return self.card.ioctl(op, arg)
\ No newline at end of file
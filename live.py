@@ -0,0 +1,49 @@
+import json, records
+
+"""
+Live readings for the web API
+
+main hands over the latest reading every Update Interval and each logged row every Log Interval. Both are turned
+into JSON once when they arrive and kept in RAM (the rows in a ring of the last HISTORY), so /api/current and
+/api/history send ready made bytes to every client without touching the microSD card. The latest reading is also
+kept as text for /current
+
+Usage:
+live.update(time, rpm, speed, temp, hum)
+live.log(time, values)
+live.history(6) -> b'[{...}, ...]'
+"""
+
+HISTORY = 36 # 6 hours of rows at the default Log Interval
+KEYS = tuple(f[0].lower().replace(" ", "_") for f in records.FIELDS) # "Max RPM" -> "max_rpm"
+
+current = b"{}" # latest reading as JSON
+text = b"RPM: 0.00\nSpeed: 0.00\nTemperature: 0\nHumidity: 0\n" # latest reading as text
+rows = [b""] * HISTORY # logged rows as JSON, a ring
+count = 0 # rows logged since starting, the next one goes in rows[count % HISTORY]
+
+def iso(time) -> str:
+    return f"{time[0]:04d}-{time[1]:02d}-{time[2]:02d}T{time[3]:02d}:{time[4]:02d}:{time[5]:02d}"
+
+def update(time, rpm, speed, temp, hum, error=None):
+    global current, text
+    current = json.dumps({"time": iso(time), "rpm": round(rpm, 2), "speed": round(speed, 2), "temperature": temp,
+                          "humidity": hum, "error": str(error) if error else None}).encode()
+    text = f"RPM: {rpm:.2f}\nSpeed: {speed:.2f}\nTemperature: {temp}\nHumidity: {hum}\n".encode()
+
+def log(time, values):
+    """
+    Adds a logged row, values are in records.FIELDS order
+    """
+    global count
+    row = {"time": iso(time)}
+    for key, value in zip(KEYS, values): row[key] = round(value, 2) if isinstance(value, float) else value
+    rows[count % HISTORY] = json.dumps(row).encode()
+    count += 1
+
+def history(n=HISTORY) -> bytes:
+    """
+    The last n logged rows as a JSON list, oldest first
+    """
+    n = max(0, min(n, count, HISTORY))
+    return b"[" + b",".join(rows[(count - n + i) % HISTORY] for i in range(n)) + b"]"
@@ -1,16 +1,16 @@
-if __name__ == "__main__": import temperature, SDsave, server
-import machine, utime, ssd1306, _thread, configparser, ds3231, gc # import required libraries
-last_log_time = utime.ticks_ms() # setup initial log output time so log time doesn't start at 2
+if __name__ == "__main__": import temperature, SDsave, server, anemometer, stats, scheduler, profiler, settings, records, errors, checkpoint, rollups, live
+import machine, utime, ssd1306, ds3231 # import required libraries
 
 """
 Error codes:
-ERR - Unknown error, see 'error log.log' for more info
+ERR - Unknown error, see 'error log.log' for more info. The system restarts after 5 seconds and carries on from the last checkpoint
 ERR: 0 - Error with temperature/humidity sensor. Usually means system cant see the temperature/humidity sensor
 ERR: 1 - System doesn't see microSD card
 ERR: 2 - Couldn't calculate rpm
 ERR: 3 - Couldn't connect to network
 ERR: 4 - RTC module error. Usually means system cant see the ds3231 module
 ERR: 5 - No 'settings.ini' file
+ERR: 6 - Invalid setting in 'settings.ini', see 'error log.log' for which one
 """
 
 debug = True # default debug toggle
@@ -60,13 +60,27 @@ if not rtc_error: # code doesn't run if an error is found with rtc module
                 settings_error = True
             if not settings_error: # code doesn't run there is no 'settings.ini' file found
                 try:
-                    config = configparser.ConfigParser()
-                    config.read("settings.ini")
+                    # settings are parsed and checked once, everything after this uses the typed attributes
+                    config = settings.Settings()
+                    try: config.load("settings.ini")
+                    except ValueError as e:
+                        if debug: print(e)
+                        oled.fill(0)
+                        oled.text("ERR: 6", 0, 0)
+                        oled.show()
+                        raise
 
-                    debug = bool(config["Other"]["Debug"])
+                    debug = config.debug
+                    profiler.enabled = config.profiling
+                    SDsave.flush_size, SDsave.flush_age = config.flush_size, config.flush_age
+                    errors.window, errors.max_lines = config.error_window, config.max_error_lines
 
                     def getTime() -> tuple: # type: ignore
-                        try: return rtc.get_time()
+                        t = profiler.start()
+                        try:
+                            time = rtc.get_time()
+                            profiler.stop(profiler.RTC, t)
+                            return time
                         except Exception as e:
                             if debug: print(e, "Couldnt get the time")
                             SDsave.error(e, "Couldnt get the time")
@@ -82,183 +96,216 @@ if not rtc_error: # code doesn't run if an error is found with rtc module
                     else: oled.text("INACTIVE", 0, 10)
                     oled.show()
                     if not debug: utime.sleep(0.5)
-                    if server_toggle: addr,s,clients = server.initialise() # initialise the webserver if toggled
+                    if server_toggle: server.initialise() # initialise the webserver if toggled
+
+                    # Configure the anemometer on GP28, edges are timestamped into a ring by the capture backend
+                    capture, backend = anemometer.create(config.capture_mode, 28, config.rising_threshold, config.falling_threshold, config.min_dwell, config.sample_period, config.block_size)
+                    wind = anemometer.Anemometer(capture, backend, config.max_time_diff, config.timeout, config.average_edges)
 
-                    anemometer = machine.ADC(machine.Pin(28)) # Configure the anemometer on GP28
+                    rpm, speed = 0, 0
+                    # running stats for the current log interval, constant memory no matter how long the interval is
+                    # only rpm has its median and 90th percentile logged, the others skip the percentile estimators
+                    rpm_stats = stats.Stats()
+                    temp_stats, hum_stats, speed_stats = stats.Stats(()), stats.Stats(()), stats.Stats(())
 
-                    # Constants
-                    THRESHOLD = int(config["RPM"]["Threshold"])  # Threshold to distinguish between high and low values
-                    MAX_TIME_DIFF = int(config["RPM"]["Max Time Diff"])  # Maximum time difference (in milliseconds) to consider valid
-                    TIMEOUT = int(config["RPM"]["Timeout"])  # Timeout in milliseconds to reset RPM to 0 if no movement
-                    UPDATE_INTERVAL = int(config["RPM"]["Update Interval"]) # Interval between updating the display in milliseconds
-                    LOG_INTERVAL = int(config["RPM"]["Log Interval"]) # Interval in ms between each log output, 600000 ms = 10 min or 600 seconds
+                    # temperature and humidity are read by a worker on the second core, results come through its mailbox
+                    temp, hum, temp_seq = 0, 0, 0
 
-                    # Variables for edge detection and timing
-                    last_output_time = utime.ticks_ms()
-                    last_value, last_edge_time, edge_times = 0, 0, []
-                    rpm, rpm_count, rpm_total, highest_rpm, avg_rpm, rotations = 0, 0, 0, 0, 0, 0
-                    collect_garbage = False
+                    def seconds(time) -> int: # seconds since 1970, 0 if the rtc module couldn't give the time
+                        return records.epoch(time) if time[0] >= 2000 else 0
 
-                    def calculate_rpm() -> float|Exception:
+                    # running totals for the interval are checkpointed so a reset doesn't lose the interval
+                    interval_stats = [rpm_stats, temp_stats, hum_stats, speed_stats]
+                    interval_start = seconds(getTime())
+
+                    def sample(current_time):
                         """
-                        Calculates current rpm using the time taken between each edge
+                        Consume the edges captured since the last run
                         """
+                        global rpm
+                        t = profiler.start()
                         try:
-                            global edge_times, rpm
-                            if len(edge_times) < 4:
-                                return 0
-                            
-                            total_time = sum(edge_times[-4:])
-                            if total_time > 0:
-                                rpm = 60000 / total_time  # One rotation per 4 edges, 60000 milliseconds in a minute
-                            return rpm
+                            rpm = wind.update(current_time)
+                            profiler.stop(profiler.SAMPLE, t)
                         except Exception as e:
+                            if debug: print(f"{e}, Error calculating rpm")
                             time = getTime()
                             SDsave.error(e, "Error while calculating rpm", f'{time[3]}:{time[4]}:{time[5]}')
-                            return e
+                            oled.fill(0)
+                            oled.text("ERR: 2", 0, 0)
+                            oled.show() # keeps sampling, the error is only logged again once its Error Window is up
 
-                    temp,hum = 0,0
-                    def temperatureCore():
+                    def display(current_time):
                         """
-                        Calculates temperature and humidity on the second core as to not interfere with first cores calculations
+                        Read the temperature/humidity and update the display, runs every Update Interval
                         """
-                        global temp, hum, collect_garbage
-                        temp, hum = temperature.read()
-                        if collect_garbage:
-                            try: gc.collect()
-                            except Exception as e:
-                                if debug: print(e, "Error while collecting garbage")
-                                SDsave.error(e, "Error while collecting garbage", f"{time[3]}:{time[4]}:{time[5]}")
-                            collect_garbage = False
-
-                    def main():
-                        # set globals
-                        global last_value, last_edge_time, edge_times, rpm, last_output_time, last_log_time, rpm_count, rpm_total, highest_rpm, rotations, addr, s, clients, rtc, config, debug, collect_garbage
-                        global UPDATE_INTERVAL, LOG_INTERVAL, THRESHOLD, MAX_TIME_DIFF, TIMEOUT
-                        # rpm_values = []
-                        try:
+                        global temp, hum, temp_seq, speed
+                        seq, new_temp, new_hum, error = temperature.mailbox.get()
+                        if error:
+                            if debug: print(f"{error}, Error on temperature core")
                             time = getTime()
-                            while True:
-                                if server_toggle: server.server(addr,s,clients) # run webserver code if toggled
+                            SDsave.error(error, "Error on temperature core", f"{time[3]}:{time[4]}:{time[5]}") # keeps going with the last good reading
 
-                                current_value = anemometer.read_u16() # get anemometer analogue value
-                                current_time = utime.ticks_ms()  # get current time in milliseconds
-                                
-                                if (current_value < THRESHOLD and last_value >= THRESHOLD) or \
-                                (current_value >= THRESHOLD and last_value < THRESHOLD):
-                                    # edge detected
-                                    edge_time = utime.ticks_diff(current_time, last_edge_time)
-                                    rotations += 0.25
-                                    
-                                    if edge_time < MAX_TIME_DIFF:
-                                        edge_times.append(edge_time)
-                                        if len(edge_times) > 4:
-                                            edge_times.pop(0)
-                                        
-                                        rpm = calculate_rpm()
-                                        if type(rpm) == Exception:
-                                            if debug: print(f"{rpm}, Error calculating rpm")
-                                            time = getTime()
-                                            oled.fill(0)
-                                            oled.text("ERR: 2", 0, 0)
-                                            oled.show()
-                                            utime.sleep(1)
-                                            break
-                                    last_edge_time = current_time  # update last_edge_time for every edge detection
+                        # add rpm values for the interval stats, 0 rpm is left out so the average isn't dragged down while still
+                        cal = config.calibration # rpm to wind speed lookup table, None if settings.ini has no [Calibration] section
+                        if cal: speed = cal.speed(rpm)
+                        if rpm != 0:
+                            rpm_stats.add(rpm)
+                            speed_stats.add(speed)
+                        if seq != temp_seq and not error: # only count each temperature/humidity reading once
+                            temp, hum, temp_seq = new_temp, new_hum, seq
+                            temp_stats.add(temp)
+                            hum_stats.add(hum)
 
-                                # check for timeout
-                                if utime.ticks_diff(current_time, last_edge_time) > TIMEOUT:
-                                    rpm = 0
-                                    edge_times = []
+                        time = getTime() if debug or server_toggle else None
+                        if debug:
+                            print(f"Current RPM: {rpm:.2f}, Speed: {speed:.2f}, Temperature: {temp}°C, Humidity: {hum}%, Time: {time[3]}:{time[4]}:{time[5]}")
+                        if server_toggle: # latest values for the webserver, encoded once here for every client
+                            live.update(time, rpm, speed, temp, hum, error)
+                            server.publish() # push it to /events clients
+                        # output values to the display
+                        oled.fill(0) # clear the display
+                        if cal: oled.text(f"RPM:{rpm:.0f} {speed:.1f}{cal.units}", 0, 0)
+                        else: oled.text(f"RPM: {rpm:.2f}", 0, 0)
+                        oled.text("ERR: 0" if error else f"Temp: {temp}C", 0, 10)
+                        oled.text(f"Hum: {hum}%", 0, 20)
+                        # oled.text(f"{time[3]}:{time[4]}:{time[5]}", 0, 20)
+                        t = profiler.start()
+                        oled.show()
+                        profiler.stop(profiler.DISPLAY, t)
 
-                                if utime.ticks_diff(current_time, last_output_time) >= UPDATE_INTERVAL:
-                                    _thread.start_new_thread(temperatureCore,())
-                                    if temp == None:
-                                        if debug: print(f"{hum}, Error on temperature core")
-                                        time = getTime()
-                                        SDsave.error(Exception(hum), "Error on temperature core", f"{time[3]}:{time[4]}:{time[5]}")
-                                        oled.fill(0)
-                                        oled.text("ERR: 0", 0, 0)
-                                        oled.show()
-                                        utime.sleep(1)
-                                        break
-                                    
-                                    # alternate average method incase timeout is set above 4 seconds to stop average from being affected too heavily
-                                    # if len(rpm_values) >= (TIMEOUT/1000): rpm_values = []
-                                    # rpm_values.append(rpm)
-                                    # if len(rpm_values) - 2 >= 0 and rpm_values[-3] != rpm and rpm != 0:
-                                    #     rpm_count += 1
-                                    #     rpm_total += rpm
-                                    # else:
-                                    #     rpm_count += 1
-                                    #     rpm_total += rpm
-                                    
-                                    # set highest rpm
-                                    if rpm > highest_rpm: highest_rpm = rpm  # type: ignore
-                                    # add rpm values for average
-                                    if rpm != 0:
-                                        rpm_count += 1
-                                        rpm_total += rpm # type: ignore
+                    def log(current_time):
+                        """
+                        Save data to microSD card, runs every Log Interval (10 minutes by default)
+                        """
+                        global interval_start
+                        cal = config.calibration
+                        time = getTime() # get current date and time
 
-                                    if debug: time = getTime()
-                                    if debug: print(f"Current RPM: {rpm:.2f}, Temperature: {temp}°C, Humidity: {hum}%, Time: {time[3]}:{time[4]}:{time[5]}")
-                                    # output values to the display
-                                    oled.fill(0) # clear the display
-                                    oled.text(f"RPM: {rpm:.2f}", 0, 0)
-                                    oled.text(f"Temp: {temp}C", 0, 10)
-                                    oled.text(f"Hum: {hum}%", 0, 20)
-                                    # oled.text(f"{time[3]}:{time[4]}:{time[5]}", 0, 20)
-                                    oled.show()
-                                    # reset output time so this code runs the next second
-                                    last_output_time = current_time
+                        # 0 rpm isn't added to the stats, so no rpm values means no wind. No temperature/humidity readings means
+                        # the sensor wasn't working, those are logged as missing rather than 0
+                        calm = not rpm_stats.count
+                        read = temp_stats.count > 0
+                        # max rpm, avg rpm, rotations, temp, hum, min rpm, rpm std, rpm p50, rpm p90, min/max/avg temp, min/max/avg hum, max/avg speed
+                        values = (0 if calm else rpm_stats.max, 0 if calm else rpm_stats.mean, wind.rotations, temp if read else None, hum if read else None,
+                                  0 if calm else rpm_stats.min, rpm_stats.std(), rpm_stats.percentile(0), rpm_stats.percentile(1),
+                                  temp_stats.min, temp_stats.max, temp_stats.mean,
+                                  hum_stats.min, hum_stats.max, hum_stats.mean,
+                                  cal.speed(0 if calm else rpm_stats.max) if cal else None, (0 if calm else speed_stats.mean) if cal else None)
+                        t = profiler.start()
+                        SDsave.data(time, values) # save data to the current data segment
+                        profiler.stop(profiler.LOG, t)
+                        if server_toggle: live.log(time, values) # for /api/history
 
-                                if utime.ticks_diff(current_time, last_log_time) >= LOG_INTERVAL:
-                                    # save data to microSD card every 10 minutes
+                        if debug:
+                            print(records.format_values(values, "txt"))
+                            print(", ".join(f"{p.name}: {p.runs} runs, {p.misses} missed deadlines (max {p.max_late}ms late)" for p in tasks.periodics))
 
-                                    # calculate average rpm
-                                    if rpm_count > 0: avg_rpm = rpm_total/rpm_count
-                                    else: avg_rpm = 0
+                        # reset values for next 10 minutes
+                        wind.rotations = 0
+                        rpm_stats.reset()
+                        speed_stats.reset()
+                        temp_stats.reset()
+                        hum_stats.reset()
+                        interval_start = seconds(time)
+                        save_checkpoint(current_time) # so a reset now doesn't bring back the interval just saved
+                        temperature.collect_garbage() # deferred to the second core
+
+                    def save_checkpoint(current_time):
+                        """
+                        Save the running totals of the current interval, runs every Checkpoint Interval and after each log
+                        """
+                        checkpoint.save(seconds(getTime()), interval_start, wind.rotations, interval_stats, (rollups.hourly, rollups.daily))
 
-                                    time = getTime() # get current date and time
+                    def profile(current_time):
+                        """
+                        Save a summary of the stage timings to the debug log, runs every Profile Interval when profiling is on
+                        """
+                        if not profiler.enabled: return
+                        time = getTime()
+                        SDsave.debug(profiler.summary(), f"{time[3]}:{time[4]}:{time[5]}")
 
-                                    txt_data = f'{highest_rpm:.2f}, {avg_rpm:.2f}, {rotations}, {temp}, {hum}'
-                                    if config["Other"]["File Type"] == "txt":
-                                        txt_time = f'{time[0]}/{time[1]}/{time[2]}, {time[3]}:{time[4]}:{time[5]}'
-                                        SDsave.data(txt_data, txt_time) # save data to txt
-                                    elif config["Other"]["File Type"] == "csv":
-                                        csv_time = f'{time[0]}/{time[1]}/{time[2]} ;{time[3]}:{time[4]}:{time[5]}'
-                                        csv_data = f'{highest_rpm:.2f};{avg_rpm:.2f};{rotations};{temp};{hum}'
-                                        SDsave.data(csv_data, csv_time) # save data to csv
+                    def reload(current_time):
+                        """
+                        Pick up changes to settings.ini, only stats the file unless it has changed
+                        """
+                        global debug
+                        try:
+                            if not config.check(): return
+                        except Exception as e: # keep running on the old settings
+                            if debug: print(e, "Couldnt reload settings.ini")
+                            time = getTime()
+                            SDsave.error(e, "Couldnt reload settings.ini", f"{time[3]}:{time[4]}:{time[5]}")
+                            return
+                        debug = config.debug
+                        profiler.enabled = config.profiling
+                        SDsave.flush_size, SDsave.flush_age = config.flush_size, config.flush_age
+                        errors.window, errors.max_lines = config.error_window, config.max_error_lines
+                        wind.max_time_diff, wind.timeout = config.max_time_diff, config.timeout
+                        backend.set_thresholds(config.rising_threshold, config.falling_threshold)
+                        backend.dwell = config.min_dwell
+                        sample_task.period, display_task.period, log_task.period, profile_task.period = config.process_interval, config.update_interval, config.log_interval, config.profile_interval
+                        checkpoint_task.period = config.checkpoint_interval
+                        if debug: print("Reloaded settings.ini") # capture mode, sample period, block size and average edges need a restart
 
-                                    if debug: print(txt_data)
+                    def task_error(task, e):
+                        """
+                        A job raised, log it and let it run again next period instead of stopping the station
+                        """
+                        if debug: print(f"{e}, Error in {task.name} task")
+                        time = getTime()
+                        SDsave.error(e, f"Error in {task.name} task", f"{time[3]}:{time[4]}:{time[5]}")
 
-                                    # reset values for next 10 minutes
-                                    rotations, rpm_count, rpm_total, highest_rpm = 0, 0, 0, 0
-                                    last_log_time = current_time
-                                    collect_garbage = True
+                    # each job runs as its own task so a slow job only delays itself
+                    tasks = scheduler.Scheduler(task_error)
+                    sample_task = tasks.every("sample", config.process_interval, sample)
+                    display_task = tasks.every("display", config.update_interval, display)
+                    log_task = tasks.every("log", config.log_interval, log)
+                    profile_task = tasks.every("profile", config.profile_interval, profile)
+                    checkpoint_task = tasks.every("checkpoint", config.checkpoint_interval, save_checkpoint)
+                    tasks.every("settings", config.settings_check_interval, reload)
+                    tasks.every("flush", 1000, lambda current_time: SDsave.flush_due()) # write out log buffers older than Flush Age and error summaries
+                    profiler.periodics = tasks.periodics
+                    if server_toggle: tasks.spawn(server.start()) # run webserver if toggled
 
-                                last_value = current_value
-                                utime.sleep(0.005) # small delay so sensors can update correctly
-                        except Exception as e:
-                            # check for errors in the main loop
-                            if debug: print(f'{e}, "Error in main loop"')
-                            time = getTime()
-                            SDsave.error(e, "Error in main loop", f"{time[3]}:{time[4]}:{time[5]}")
-                            oled.fill(0)
-                            oled.text("ERR", 0, 0)
-                            oled.show()
+                    # carry on the interval that was running before a reset if it hasn't ended yet, otherwise (e.g. after being
+                    # turned off for a day) its readings are dropped rather than logged with today's time. The open
+                    # hourly/daily rollups are always restored
+                    saved = checkpoint.load(interval_stats, (rollups.hourly, rollups.daily))
+                    if saved and interval_start and 0 < saved[1] <= interval_start and interval_start - saved[1] < config.log_interval // 1000:
+                        log_task.first = config.log_interval - (interval_start - saved[1]) * 1000 # log when the interval would have ended
+                        interval_start, wind.rotations = saved[1], saved[2]
+                        checkpoint.restore(interval_stats, saved[3])
+                        if debug: print(f"Resumed interval from checkpoint, logging in {log_task.first}ms")
 
                     # start script
                     try:
-                        if __name__ == "__main__": main()
+                        if __name__ == "__main__":
+                            temperature.start(config.update_interval)
+                            SDsave.write_behind = True # buffer log writes in RAM while running
+                            tasks.run()
+                            temperature.stop()
+                            SDsave.write_behind = False
+                            SDsave.summarise(True)
+                            SDsave.flush() # write out anything still buffered
                     except Exception as e:
+                        temperature.stop()
+                        SDsave.write_behind = False
                         # check for errors in the main loop
                         if debug: print(f'{e}, "Error in main loop"')
                         time = getTime()
                         SDsave.error(e, "Error in main loop", f"{time[3]}:{time[4]}:{time[5]}")
+                        SDsave.summarise(True)
+                        SDsave.flush()
                         oled.fill(0)
                         oled.text("ERR", 0, 0)
                         oled.show()
+                        # restart and resume the interval from the checkpoint, unless it failed straight after starting
+                        # so a fault at startup can't keep restarting the Pico
+                        if utime.ticks_ms() > 60000:
+                            save_checkpoint(0)
+                            utime.sleep(5)
+                            machine.reset()
                 except Exception as e:
                     if debug: print(e, "Error :[)")
                     SDsave.error(e, "Error :[)")
\ No newline at end of file
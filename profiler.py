@@ -0,0 +1,71 @@
+import array
+from utime import ticks_us, ticks_diff
+
+"""
+Hot loop timing
+
+Each stage gets a histogram of how long it took in power of 2 microsecond buckets plus its count, total and
+max. Everything is preallocated so timing a stage doesn't allocate, and when profiling is off (settings.ini
+[Other] Profiling) start() and stop() return straight away
+
+Usage:
+t = profiler.start()
+oled.show()
+profiler.stop(profiler.DISPLAY, t)
+"""
+
+STAGES = ("sample", "rtc", "display", "log", "web")
+SAMPLE, RTC, DISPLAY, LOG, WEB = 0, 1, 2, 3, 4
+BUCKETS = 20 # bucket i holds times under 2**i us, the last bucket holds everything above ~0.5 s
+
+enabled = False
+periodics = [] # scheduler tasks, their deadline misses are included in the report
+counts = array.array('L', [0]*len(STAGES))
+totals = array.array('L', [0]*len(STAGES)) # in ms so it doesn't overflow
+remainders = array.array('L', [0]*len(STAGES)) # us not yet added to totals, so stages under 1ms still add up
+max_us = array.array('L', [0]*len(STAGES))
+histogram = array.array('L', [0]*(len(STAGES)*BUCKETS))
+
+def start() -> int:
+    return ticks_us() if enabled else 0
+
+def stop(stage, start):
+    if not enabled: return
+    us = ticks_diff(ticks_us(), start)
+    counts[stage] += 1
+    rem = remainders[stage] + us # carry the us over rather than dropping them
+    if rem >= 1000:
+        totals[stage] += rem // 1000
+        rem %= 1000
+    remainders[stage] = rem
+    if us > max_us[stage]: max_us[stage] = us
+    bucket = 0
+    while us and bucket < BUCKETS - 1:
+        us >>= 1
+        bucket += 1
+    histogram[stage*BUCKETS + bucket] += 1
+
+def reset():
+    for i in range(len(STAGES)): counts[i], totals[i], remainders[i], max_us[i] = 0, 0, 0, 0
+    for i in range(len(histogram)): histogram[i] = 0
+
+def total_us(stage) -> int:
+    return totals[stage] * 1000 + remainders[stage]
+
+def report() -> str:
+    """
+    Full report for the /metrics page, one line per stage followed by its non empty histogram buckets
+    """
+    lines = [f"profiling {'on' if enabled else 'off'}"]
+    for i, name in enumerate(STAGES):
+        buckets = " ".join(f"<{2**b}us:{histogram[i*BUCKETS + b]}" for b in range(BUCKETS) if histogram[i*BUCKETS + b])
+        lines.append(f"{name} count={counts[i]} total_ms={total_us(i) / 1000:.3f} max_us={max_us[i]} {buckets}")
+    for p in periodics:
+        lines.append(f"task {p.name} runs={p.runs} errors={p.errors} unreported={p.unreported} misses={p.misses} max_late_ms={p.max_late}")
+    return "\n".join(lines) + "\n"
+
+def summary() -> str:
+    """
+    One line summary for the debug log
+    """
+    return "; ".join(f"{name} n={counts[i]} avg={total_us(i) // counts[i] if counts[i] else 0}us max={max_us[i]}us" for i, name in enumerate(STAGES))
@@ -0,0 +1,154 @@
+import struct
+
+"""
+Data log record format
+
+Every logged interval is a fixed list of values (FIELDS). In txt/csv mode they are formatted as text, in bin mode
+each interval is packed into a fixed size record of scaled integers after a small versioned header:
+
+header: 4s magic b"WSTN", B version, B record size, H reserved
+record: I seconds since 1970 then one integer per field (value * scale), the highest value of an unsigned field
+(0xFFFF) or the lowest of a signed one (-0x8000) means no value
+
+The converter here turns a data.bin back into txt/csv lines, it is used by the webserver for /download and also
+runs on a computer: python records.py data.bin [csv|txt] > data.csv
+"""
+
+MAGIC = b"WSTN"
+VERSION = 1
+HEADER = "<4sBBH"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+# name, struct code, scale, text format
+FIELDS = (
+    ("Max RPM", "H", 10, "{:.2f}"),
+    ("Avg RPM", "H", 10, "{:.2f}"),
+    ("Rotations", "I", 4, "{}"),
+    ("Temperature", "h", 10, "{}"),
+    ("Humidity", "H", 10, "{}"),
+    ("Min RPM", "H", 10, "{:.2f}"),
+    ("RPM Std", "H", 10, "{:.2f}"),
+    ("RPM P50", "H", 10, "{:.2f}"),
+    ("RPM P90", "H", 10, "{:.2f}"),
+    ("Min Temperature", "h", 10, "{}"),
+    ("Max Temperature", "h", 10, "{}"),
+    ("Avg Temperature", "h", 10, "{:.1f}"),
+    ("Min Humidity", "H", 10, "{}"),
+    ("Max Humidity", "H", 10, "{}"),
+    ("Avg Humidity", "H", 10, "{:.1f}"),
+    ("Max Speed", "H", 100, "{:.2f}"),
+    ("Avg Speed", "H", 100, "{:.2f}"),
+)
+RECORD = "<I" + "".join(f[1] for f in FIELDS)
+RECORD_SIZE = struct.calcsize(RECORD)
+MISSING = {"H": 0xFFFF, "h": -0x8000, "I": 0xFFFFFFFF}
+LIMITS = {"H": (0, 0xFFFE), "h": (-0x7FFF, 0x7FFF), "I": (0, 0xFFFFFFFE)} # values are clamped to these, clear of MISSING
+
+CSV_HEADER = "Date;Time;" + ";".join(f[0] for f in FIELDS) + "\n"
+
+def epoch(time) -> int:
+    """
+    Seconds since 1970 for a (year, month, day, hour, minute, second, ...) tuple, the same on every port
+    """
+    y, m, d = time[0], time[1], time[2]
+    y -= m <= 2
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + (-3 if m > 2 else 9)) + 2) // 5 + d - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    return days * 86400 + time[3] * 3600 + time[4] * 60 + time[5]
+
+def from_epoch(seconds) -> tuple:
+    """
+    (year, month, day, hour, minute, second) for seconds since 1970
+    """
+    days, rem = divmod(seconds, 86400)
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = mp + (3 if mp < 10 else -9)
+    y = yoe + era * 400 + (m <= 2)
+    return (y, m, d, rem // 3600, rem % 3600 // 60, rem % 60)
+
+def parse_time(text, end=False) -> int:
+    """
+    '1760745600', '2026-10-17' or '2026-10-17T18:30' -> seconds since 1970. A date on its own is the start of the day,
+    or the last second of it if end is True
+    """
+    if text.isdigit(): return int(text)
+    date, _, clock = text.partition("T")
+    y, m, d = (int(v) for v in date.split("-"))
+    parts = [int(v) for v in clock.split(":")] if clock else [23, 59, 59] if end else []
+    parts += [0] * (3 - len(parts))
+    return epoch((y, m, d) + tuple(parts[:3]))
+
+def line_epoch(line):
+    """
+    Seconds since 1970 of a txt/csv data line, None for the csv header or a line that can't be read
+    """
+    date, _, rest = line.partition(" ") # '2026/10/17, 18:0:0, ...' or '2026/10/17 ;18:0:0;...'
+    try:
+        y, m, d = (int(v) for v in date.rstrip(",").split("/"))
+        h, mi, s = (int(v) for v in rest.lstrip(";").split(";")[0].split(",")[0].split(":"))
+    except ValueError: return None
+    return epoch((y, m, d, h, mi, s))
+
+def header() -> bytes:
+    return struct.pack(HEADER, MAGIC, VERSION, RECORD_SIZE, 0)
+
+def pack(seconds:int, values) -> bytes:
+    """
+    Pack one interval, seconds since 1970 (0 if the time isn't known) and values in FIELDS order, which can be None
+    for missing values
+    """
+    ints = [seconds]
+    for (name, code, scale, fmt), value in zip(FIELDS, values):
+        if value is None: ints.append(MISSING[code])
+        else:
+            low, high = LIMITS[code]
+            ints.append(min(high, max(low, round(value * scale))))
+    return struct.pack(RECORD, *ints)
+
+def unpack(record) -> tuple:
+    """
+    Returns (time tuple, values), the time is all 0s if it wasn't known, like the txt/csv lines
+    """
+    ints = struct.unpack(RECORD, record)
+    values = []
+    for (name, code, scale, fmt), value in zip(FIELDS, ints[1:]):
+        values.append(None if value == MISSING[code] else value / scale)
+    return from_epoch(ints[0]) if ints[0] else (0, 0, 0, 0, 0, 0), values
+
+def format_time(time, file_type) -> str:
+    if file_type == "csv": return f'{time[0]}/{time[1]}/{time[2]} ;{time[3]}:{time[4]}:{time[5]}'
+    return f'{time[0]}/{time[1]}/{time[2]}, {time[3]}:{time[4]}:{time[5]}'
+
+def format_values(values, file_type) -> str:
+    return (";" if file_type == "csv" else ", ").join("" if v is None else f[3].format(v) for f, v in zip(FIELDS, values))
+
+def format_line(time, values, file_type) -> str:
+    return format_time(time, file_type) + (";" if file_type == "csv" else ", ") + format_values(values, file_type) + "\n"
+
+def convert(file, file_type="csv"):
+    """
+    Reads a data.bin from an open binary file and yields it as text lines, one record at a time
+    """
+    head = file.read(HEADER_SIZE)
+    if len(head) < HEADER_SIZE: return
+    magic, version, size, _ = struct.unpack(HEADER, head)
+    if magic != MAGIC or version != VERSION or size != RECORD_SIZE:
+        raise ValueError(f"Unsupported data file (version {version}, record size {size})")
+    if file_type == "csv": yield CSV_HEADER
+    buf = bytearray(RECORD_SIZE)
+    while file.readinto(buf) == RECORD_SIZE:
+        time, values = unpack(buf)
+        yield format_line(time, values, file_type)
+
+if __name__ == "__main__":
+    import sys
+    with open(sys.argv[1], "rb") as file:
+        for line in convert(file, sys.argv[2] if len(sys.argv) > 2 else "csv"): sys.stdout.write(line)
@@ -0,0 +1,146 @@
+import struct, records
+
+"""
+Hourly and daily rollups
+
+Each logged interval is added to the open hourly and daily rollup (max rpm, mean rpm, total rotations and the
+temperature/humidity range). When a row arrives for the next hour or day the open rollup is closed and saved as a
+fixed size record, so long range graphs read one row per hour or day instead of every logged interval.
+
+file: records.HEADER (magic b"WSRU", version, record size, hours per record) then one record per rollup
+record: I start (seconds since 1970) then the values below scaled like records.py, with the same missing values
+"""
+
+MAGIC = b"WSRU"
+VERSION = 1
+
+# name, struct code, scale, text format
+FIELDS = (
+    ("Max RPM", "H", 10, "{:.2f}"),
+    ("Avg RPM", "H", 10, "{:.2f}"),
+    ("Rotations", "I", 4, "{}"),
+    ("Min Temperature", "h", 10, "{}"),
+    ("Max Temperature", "h", 10, "{}"),
+    ("Min Humidity", "H", 10, "{}"),
+    ("Max Humidity", "H", 10, "{}"),
+    ("Rows", "H", 1, "{}"),
+)
+RECORD = "<I" + "".join(f[1] for f in FIELDS)
+RECORD_SIZE = struct.calcsize(RECORD)
+
+CSV_HEADER = "Date;Time;" + ";".join(f[0] for f in FIELDS) + "\n"
+
+class Rollup:
+    def __init__(self, period:int):
+        self.period = period # seconds
+        self.reset(0)
+
+    def reset(self, start:int):
+        self.start = start
+        self.rows = 0
+        self.max_rpm = 0
+        self.rpm_total = 0
+        self.rotations = 0
+        self.min_temp, self.max_temp, self.min_hum, self.max_hum = None, None, None, None
+
+    def add(self, values):
+        """
+        Adds one logged interval, values are in records.FIELDS order
+        """
+        self.rows += 1
+        if values[0] is not None and values[0] > self.max_rpm: self.max_rpm = values[0]
+        if values[1] is not None: self.rpm_total += values[1]
+        if values[2] is not None: self.rotations += values[2]
+        for low, high in ((values[9], values[10]), (values[3], values[3])): # interval min/max and the last reading
+            if low is None or high is None: continue
+            if self.min_temp is None or low < self.min_temp: self.min_temp = low
+            if self.max_temp is None or high > self.max_temp: self.max_temp = high
+        for low, high in ((values[12], values[13]), (values[4], values[4])):
+            if low is None or high is None: continue
+            if self.min_hum is None or low < self.min_hum: self.min_hum = low
+            if self.max_hum is None or high > self.max_hum: self.max_hum = high
+
+    def state(self) -> list:
+        """
+        The open rollup as numbers for checkpoint.py (start is saved separately), missing values are nan
+        """
+        return [v if v is not None else float("nan") for v in (self.rows, self.max_rpm, self.rpm_total, self.rotations,
+                self.min_temp, self.max_temp, self.min_hum, self.max_hum)]
+
+    def restore(self, start:int, values):
+        values = [None if v != v else v for v in values] # nan != nan
+        self.start = start
+        self.rows = int(values[0])
+        self.max_rpm, self.rpm_total, self.rotations = values[1], values[2], values[3]
+        self.min_temp, self.max_temp, self.min_hum, self.max_hum = values[4], values[5], values[6], values[7]
+
+    STATE_SIZE = 8
+
+    def values(self) -> tuple:
+        return (self.max_rpm, self.rpm_total / self.rows if self.rows else 0, self.rotations,
+                self.min_temp, self.max_temp, self.min_hum, self.max_hum, self.rows)
+
+    def pack(self) -> bytes:
+        ints = [self.start]
+        for (name, code, scale, fmt), value in zip(FIELDS, self.values()):
+            if value is None: ints.append(records.MISSING[code])
+            else:
+                low, high = records.LIMITS[code] # clear of the missing value
+                ints.append(min(high, max(low, round(value * scale))))
+        return struct.pack(RECORD, *ints)
+
+hourly = Rollup(3600)
+daily = Rollup(86400)
+
+def add(seconds:int, values) -> list:
+    """
+    Adds a logged interval to the hourly and daily rollups, returns (rollup, record) for each rollup it closed
+    """
+    closed = []
+    for rollup in (hourly, daily):
+        start = seconds - seconds % rollup.period
+        if start != rollup.start:
+            if rollup.rows: closed.append((rollup, rollup.pack()))
+            rollup.reset(start)
+        rollup.add(values)
+    return closed
+
+def header(period:int) -> bytes:
+    return struct.pack(records.HEADER, MAGIC, VERSION, RECORD_SIZE, period // 3600)
+
+def unpack(record) -> tuple:
+    """
+    Returns (start, values)
+    """
+    ints = struct.unpack(RECORD, record)
+    values = []
+    for (name, code, scale, fmt), value in zip(FIELDS, ints[1:]):
+        values.append(None if value == records.MISSING[code] else value / scale if scale != 1 else value)
+    return ints[0], values
+
+def format_line(start:int, values) -> str:
+    return records.format_time(records.from_epoch(start), "csv") + ";" + ";".join("" if v is None else f[3].format(v) for f, v in zip(FIELDS, values)) + "\n"
+
+def read(file, start=0, end=0xFFFFFFFF):
+    """
+    Yields the csv lines of the rollups in an open rollup file that start between start and end. Records are in
+    time order so the first one is found with a binary search
+    """
+    head = file.read(records.HEADER_SIZE)
+    if len(head) < records.HEADER_SIZE: return
+    magic, version, size, _ = struct.unpack(records.HEADER, head)
+    if magic != MAGIC or version != VERSION or size != RECORD_SIZE:
+        raise ValueError(f"Unsupported rollup file (version {version}, record size {size})")
+    buf = bytearray(RECORD_SIZE)
+    low, high = 0, (file.seek(0, 2) - records.HEADER_SIZE) // RECORD_SIZE
+    while low < high:
+        middle = (low + high) // 2
+        file.seek(records.HEADER_SIZE + middle * RECORD_SIZE)
+        file.readinto(buf)
+        if struct.unpack_from("<I", buf)[0] < start: low = middle + 1
+        else: high = middle
+    file.seek(records.HEADER_SIZE + low * RECORD_SIZE)
+    while file.readinto(buf) == RECORD_SIZE:
+        time, values = unpack(buf)
+        if time > end: break
+        yield format_line(time, values)
@@ -0,0 +1,90 @@
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_diff, ticks_add
+
+"""
+Cooperative scheduler for the station
+
+Each job (sampling, display, logging) runs as its own asyncio task with its own period, so a slow job only
+delays itself and the web server can run alongside without starving the anemometer. A run that finishes after
+the next run was due counts as a deadline miss. If the scheduler has an on_error handler a job that raises is
+reported to it and keeps running (even if reporting it fails), otherwise the error stops everything
+"""
+
+async def sleep_ms(ms):
+    if hasattr(asyncio, "sleep_ms"): await asyncio.sleep_ms(ms)
+    else: await asyncio.sleep(ms / 1000)
+
+class Periodic:
+    """
+    Calls fn(now) every period ms
+    """
+    def __init__(self, scheduler, name, period, fn):
+        self.scheduler = scheduler
+        self.name = name
+        self.period = period
+        self.fn = fn
+        self.first = None # ms until the first run, defaults to the period
+        self.runs = 0
+        self.errors = 0
+        self.unreported = 0 # errors on_error itself failed on, e.g. the card failing while logging the error
+        self.misses = 0 # runs that finished after the next run was due
+        self.max_late = 0 # longest a run has overrun its deadline by in ms
+
+    async def run(self):
+        next_run = ticks_add(ticks_ms(), self.period if self.first is None else self.first)
+        while True:
+            delay = ticks_diff(next_run, ticks_ms())
+            if delay > 0: await sleep_ms(delay)
+            else: await sleep_ms(0) # always give the other tasks a turn
+            try: self.fn(ticks_ms())
+            except Exception as e:
+                self.errors += 1
+                if not self.scheduler.on_error:
+                    self.scheduler.stop(e)
+                    return
+                try: self.scheduler.on_error(self, e)
+                except Exception: self.unreported += 1 # the job keeps running either way
+            self.runs += 1
+            next_run = ticks_add(next_run, self.period)
+            late = ticks_diff(ticks_ms(), next_run)
+            if late >= 0: # missed the next deadline, skip ahead instead of running back to back to catch up
+                self.misses += 1
+                if late > self.max_late: self.max_late = late
+                next_run = ticks_add(ticks_ms(), self.period)
+
+class Scheduler:
+    """
+    Runs the periodic jobs and any other coroutines until stop() is called
+    """
+    def __init__(self, on_error=None):
+        self.on_error = on_error # on_error(periodic, error)
+        self.periodics = []
+        self.coros = []
+        self.error = None
+        self.stopped = None
+
+    def every(self, name, period, fn) -> Periodic:
+        periodic = Periodic(self, name, period, fn)
+        self.periodics.append(periodic)
+        return periodic
+
+    def spawn(self, coro):
+        self.coros.append(coro)
+
+    def stop(self, error=None):
+        """
+        Stop every task, if an error is given run() raises it once everything is stopped
+        """
+        self.error = error
+        if self.stopped: self.stopped.set()
+
+    async def _run(self):
+        self.stopped = asyncio.Event()
+        tasks = [asyncio.create_task(p.run()) for p in self.periodics]
+        tasks += [asyncio.create_task(c) for c in self.coros]
+        await self.stopped.wait()
+        for task in tasks: task.cancel()
+        if self.error: raise self.error
+
+    def run(self):
+        asyncio.run(self._run())
@@ -1,4 +1,6 @@
-import machine, ssd1306, utime, network, socket, ntptime, configparser, ds3231
+import machine, ssd1306, utime, os, io, network, ntptime, settings, ds3231, uasyncio, profiler, SDsave, records, rollups, errors, live
+try: import deflate # MicroPython 1.21+, compressing also needs a build with it turned on
+except ImportError: deflate = None
 
 # set up the display
 i2c = machine.I2C(1, scl=machine.Pin(27), sda=machine.Pin(26))
@@ -10,11 +12,11 @@ def dt_tuple(dt): return utime.localtime(utime.mktime(dt))  # type: ignore # Pop
 i2c = machine.SoftI2C(scl=machine.Pin(15, machine.Pin.OPEN_DRAIN, value=1), sda=machine.Pin(14, machine.Pin.OPEN_DRAIN, value=1))
 # rtc is declared in initialise to not pause code at start incase of error
 
+
 def adjust_time_zone(time_tuple):
-    config = configparser.ConfigParser()
-    TIME_ZONE_OFFSET = int(config["NTP Settings"]["Time Zone Offset"])
+    config = settings.Settings()
     year, month, day, hours, minutes, seconds, weekday, yearday = time_tuple
-    hours += TIME_ZONE_OFFSET
+    hours += config.time_zone_offset
     # Handle day rollover
     if hours >= 24:
         hours -= 24
@@ -41,69 +43,488 @@ def adjust_time_zone(time_tuple):
 
 
 def sync_time():
-    config = configparser.ConfigParser()
-    config.read("settings.ini")
-    TIME_ZONE_OFFSET = int(config["NTP Settings"]["Time Zone Offset"])
-    NTP_SERVER = config["NTP Settings"]["NTP Server"]
-    ntptime.host = NTP_SERVER
+    config = settings.Settings()
+    ntptime.host = config.ntp_server
     ntptime.settime()
     current_time = adjust_time_zone(utime.localtime(ntptime.time()))
     return current_time
 
-def serve_index():
-    try:
-        with open('/sd/index.html', 'r') as file:
-            return file.read()
+ASSET_MAX = 16384 # bigger files are streamed from the card in chunks every time instead of kept in RAM
+TYPES = {"html": "text/html", "css": "text/css", "js": "application/javascript", "json": "application/json",
+         "svg": "image/svg+xml", "png": "image/png", "ico": "image/x-icon", "txt": "text/plain"}
+assets = {} # file name: Asset
+
+class Asset:
+    """
+    A web page file read from the card, with its gzipped copy (name.gz on the card if there is one, otherwise
+    compressed once here if deflate can) and an ETag from its size and modification time
+    """
+    def __init__(self, name, st):
+        self.size, self.mtime = st[6], st[8]
+        self.etag = f'"{self.size:x}-{self.mtime:x}"'
+        with open('/sd/' + name, 'rb') as file: self.body = file.read()
+        try:
+            with open('/sd/' + name + '.gz', 'rb') as file: self.gz = file.read()
+        except OSError: self.gz = gzip_bytes(self.body) if gzip_available() else None
+        if self.gz is not None and len(self.gz) >= len(self.body): self.gz = None # not worth it
+
+def asset(name):
+    """
+    Returns the file from RAM, only reading the card again if its size or modification time has changed. Files over
+    ASSET_MAX are never read in whole, they are sent as a Download through the shared chunk buffer like /download
+    """
+    st = os.stat('/sd/' + name)
+    if st[6] > ASSET_MAX:
+        assets.pop(name, None) # it may have been small before
+        return Download([name], False)
+    cached = assets.get(name)
+    if cached and cached.size == st[6] and cached.mtime == st[8]: return cached
+    cached = assets[name] = Asset(name, st)
+    return cached
+
+def error(status, text):
+    """
+    A plain text error response with its status, handle_request returns (response, content type, filename, status)
+    """
+    return text, 'text/plain', None, status
+
+def serve_static(name):
+    try: return asset(name), TYPES.get(name.rsplit('.', 1)[-1], 'application/octet-stream')
     except OSError as e:
-        print(f"Error reading index.html from SD card: {e}")
-        return "Error: Could not read index.html from SD card"
+        if e.errno == 2: return error("404 Not Found", "404 Not Found") # ENOENT, no such file
+        print(f"Error reading {name} from SD card: {e}")
+        return error("500 Internal Server Error", f"Error: Could not read {name} from SD card")
+
+gzip_ok = None
+
+def gzip_available() -> bool:
+    """
+    True if this build of MicroPython can gzip, checked once
+    """
+    global gzip_ok
+    if gzip_ok is None:
+        try:
+            gzip_bytes(b"test")
+            gzip_ok = True
+        except Exception: gzip_ok = False # no deflate module or only decompression
+    return gzip_ok
+
+def gzip_bytes(data) -> bytes:
+    stream = Gzip()
+    return stream.compress(data) + stream.finish()
+
+class Gzip:
+    """
+    Compresses a response a chunk at a time, compress() returns whatever compressed data is ready
+    """
+    def __init__(self):
+        self.sink = io.BytesIO()
+        self.stream = deflate.DeflateIO(self.sink, deflate.GZIP, 10) # 1 KB window
+
+    def _take(self) -> bytes:
+        size = self.sink.tell()
+        data = self.sink.getvalue()[:size]
+        self.sink.seek(0)
+        return data
+
+    def compress(self, data) -> bytes:
+        self.stream.write(data)
+        return self._take()
 
-def handle_request(request):
-    if b'GET / ' in request:
-        return serve_index(), 'text/html'
-    elif b'GET /download ' in request:
+    def finish(self) -> bytes:
+        self.stream.close() # leaves the sink open
+        return self._take()
+
+MAX_CONNECTIONS = 8 # clients connected at once, including /events subscribers
+MAX_REQUEST = 4096 # bytes of request line and headers
+MAX_HEADERS = 32
+IDLE_TIMEOUT = 15 # seconds a kept alive connection can wait for its next request
+READ_TIMEOUT = 5 # seconds a client has to send the rest of a request once it has started
+connections = 0
+
+class Request:
+    """
+    A parsed request: method, target, path, params (the query string values), version, headers (lower case names)
+    and keep_alive
+    """
+    def __init__(self, line):
+        try: self.method, self.target, self.version = line.decode().split(' ')
+        except (ValueError, UnicodeError): raise ValueError("bad request line")
+        if not self.version.startswith('HTTP/1.'): raise ValueError("bad version")
+        self.path, self.params = parse_target(self.target)
+        self.headers = {}
+
+    def header(self, line):
+        if len(self.headers) >= MAX_HEADERS: raise ValueError("too many headers")
+        name, colon, value = line.partition(b':')
+        if not colon: raise ValueError("bad header")
+        try: self.headers[name.strip().lower().decode()] = value.strip().decode()
+        except UnicodeError: pass
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0': return connection == 'keep-alive'
+        return connection != 'close'
+
+class Parser:
+    """
+    Builds a Request from the bytes of a connection as they arrive. feed() returns the request once the blank line
+    after its headers has been seen, or None if more is needed, and raises ValueError for a bad or oversized request.
+    Bytes after the request (a pipelined next request) are kept for the next call
+    """
+    def __init__(self):
+        self.buf = b""
+        self.request = None # being parsed
+        self.size = 0 # bytes of it so far
+
+    def started(self) -> bool:
+        return bool(self.buf) or self.request is not None
+
+    def feed(self, data) -> Request:
+        self.buf += data
+        while True:
+            end = self.buf.find(b'\n')
+            if end < 0:
+                if self.size + len(self.buf) > MAX_REQUEST: raise ValueError("request too big")
+                return None
+            line = self.buf[:end].rstrip(b'\r') # clients should send \r\n but a bare \n is accepted
+            self.buf = self.buf[end + 1:]
+            self.size += end + 1
+            if self.size > MAX_REQUEST: raise ValueError("request too big")
+            if self.request is None:
+                if line: self.request = Request(line) # blank lines before a request are skipped
+            elif line: self.request.header(line)
+            else:
+                request, self.request, self.size = self.request, None, 0
+                return request
+
+async def read_request(reader, parser) -> Request:
+    """
+    Waits up to IDLE_TIMEOUT for a request to start and then READ_TIMEOUT for the rest of it, raising TimeoutError
+    if the client is too slow. None if the client closed the connection
+    """
+    request = parser.feed(b"") # the next request may have come in with the last one
+    started = None
+    while request is None:
+        if parser.started():
+            if started is None: started = utime.ticks_ms()
+            timeout = READ_TIMEOUT - utime.ticks_diff(utime.ticks_ms(), started) / 1000
+            if timeout <= 0: raise uasyncio.TimeoutError()
+        else: timeout = IDLE_TIMEOUT
+        data = await uasyncio.wait_for(reader.read(512), timeout)
+        if not data: return None
+        request = parser.feed(data)
+    return request
+
+def parse_target(target):
+    """
+    Returns the path and query string values of a request target, '/download?segment=x' -> ('/download', {'segment': 'x'})
+    """
+    path, _, query = target.partition('?')
+    params = {}
+    for pair in query.split('&'):
+        if pair:
+            key, _, value = pair.partition('=')
+            params[key] = unquote(value)
+    return path, params
+
+def unquote(text):
+    """
+    Decodes %XX escapes, browsers send 18:00 as 18%3A00
+    """
+    parts = text.split('%')
+    out = parts[0]
+    for part in parts[1:]:
+        try: out += chr(int(part[:2], 16)) + part[2:]
+        except ValueError: out += '%' + part
+    return out
+
+def handle_request(request:Request):
+    path, params = request.path, request.params
+    if request.method != 'GET':
+        return error("405 Method Not Allowed", "405 Method Not Allowed")
+    if path == '/':
+        return serve_static('index.html')
+    elif path.startswith('/static/') and '..' not in path: # more web page files, from the static folder on the card
+        return serve_static(path[1:])
+    elif path == '/current':
+        return live.text, 'text/plain'
+    elif path == '/api/current': # latest reading as JSON, e.g. {"time": "2026-10-18T12:00:00", "rpm": 120.5, ...}
+        return live.current, 'application/json'
+    elif path == '/api/history': # the last n logged rows as JSON, /api/history?n=6
+        try: n = int(params.get('n', live.HISTORY))
+        except ValueError: n = live.HISTORY
+        return live.history(n), 'application/json'
+    elif path == '/metrics':
+        sd = f"sd buffered={SDsave.bytes_buffered} flushed={SDsave.bytes_flushed} dropped={SDsave.bytes_dropped} flushes={SDsave.flushes}\n"
+        if SDsave.cache: sd += f"sd cache hits={SDsave.cache.hits} misses={SDsave.cache.misses} commands={SDsave.cache.commands}\n"
+        sd += f"web connections={connections} events subscribers={len(subscribers)} sent={events_sent} dropped={events_dropped}\n"
+        return profiler.report() + sd, 'text/plain'
+    elif path == '/errors':
+        return errors.report(), 'text/plain'
+    elif path == '/segments':
+        SDsave.flush() # make sure the manifest matches the card
+        return "File;First;Last;Rows;Bytes\n" + "".join(";".join(str(v) for v in entry) + "\n" for entry in SDsave.manifest), 'text/plain'
+    elif path in ('/hourly', '/daily'): # rollups, e.g. /daily?from=2026-01-01
+        try:
+            start = records.parse_time(params['from']) if params.get('from') else 0
+            end = records.parse_time(params['to'], True) if params.get('to') else 0xFFFFFFFF
+        except ValueError:
+            return error("400 Bad Request", "Error: from and to must look like 2026-10-17, 2026-10-17T18:00 or seconds since 1970")
+        rollup = rollups.hourly if path == '/hourly' else rollups.daily
         try:
-            config = configparser.ConfigParser()
-            config.read("settings.ini")
-
-            if config["Other"]["File Type"] == "txt":
-                with open('/sd/data.txt', 'r') as file:
-                    content = file.read()
-                return content, 'text/plain', 'data.txt'
-            
-            elif config["Other"]["File Type"] == "csv":
-                with open('/sd/data.csv', 'r') as file:
-                    content = file.read()
-                return content, 'text/plain', 'data.csv'
-            
+            SDsave.flush()
+            return stream_rollups(rollup, start, end), 'text/plain', f"{path[1:]}.csv"
         except OSError as e:
-            print(f"Error reading data.txt from SD card: {e}")
-            return "Error: Could not read data.txt from SD card", 'text/plain'
+            print(f"Error reading rollups from SD card: {e}")
+            return error("500 Internal Server Error", "Error: Could not read data from SD card")
+    elif path == '/download':
+        try:
+            config = settings.Settings()
+            SDsave.flush() # include rows still in memory
+            names = [entry[0] for entry in SDsave.manifest if entry[0].endswith('.' + config.file_type)]
+            if 'from' in params or 'to' in params: # a time range, e.g. /download?from=2026-10-17T18:00&to=2026-10-18T06:00
+                try:
+                    start = records.parse_time(params['from']) if params.get('from') else 0
+                    end = records.parse_time(params['to'], True) if params.get('to') else 0xFFFFFFFF
+                except ValueError:
+                    return error("400 Bad Request", "Error: from and to must look like 2026-10-17, 2026-10-17T18:00 or seconds since 1970")
+                names = [entry[0] for entry in SDsave.manifest if entry[0] in names and entry[2] >= start and entry[1] <= end]
+                return stream_range(names, config.file_type, start, end), 'text/plain', f"data.{'csv' if config.file_type == 'bin' else config.file_type}"
+            if 'segment' in params: # a single segment, e.g. /download?segment=2026-10-18
+                names = [name for name in names if name == f"{SDsave.DATA_DIR}/{params['segment']}.{config.file_type}"]
+                if not names: return error("404 Not Found", "404 Not Found")
+            filename = f"{params.get('segment', 'data')}.{'csv' if config.file_type == 'bin' else config.file_type}"
+            if config.file_type == "bin": return convert_segments(names), 'text/plain', filename
+            return Download(names, config.file_type == "csv"), 'text/plain', filename
+        except OSError as e:
+            print(f"Error reading data from SD card: {e}")
+            return error("500 Internal Server Error", "Error: Could not read data from SD card")
     else:
-        return "404 Not Found", 'text/plain'
+        return error("404 Not Found", "404 Not Found")
 
-def send_response(client, response, content_type, filename=None):
-    try:
-        if filename:
-            client.send(f'HTTP/1.0 200 OK\r\nContent-Type: {content_type}\r\nContent-Disposition: attachment; filename="{filename}"\r\nConnection: close\r\n\r\n')
-        else:
-            client.send(f'HTTP/1.0 200 OK\r\nContent-Type: {content_type}\r\nConnection: close\r\n\r\n')
-        if isinstance(response, str):
-            client.sendall(response.encode('utf-8'))
+# every file download is sent through this one buffer, uasyncio copies what is written into its own buffer before
+# the next await so clients can share it
+chunk = bytearray(1024)
+chunk_view = memoryview(chunk)
+
+class Download:
+    """
+    Send state of one txt/csv download (or a web page file over ASSET_MAX), each step() reads the next chunk of the current segment into the shared
+    buffer and moves on to the next segment when one runs out. Bytes go from the card to the socket as they are,
+    nothing is decoded or joined, so memory use doesn't depend on the size of the log.
+    The segments are sent as one file (later segments without their csv header), its size, ETag and Last-Modified
+    come from the segment sizes and modification times so Range and conditional requests work on it
+    """
+    def __init__(self, names, skip_headers):
+        self.names = names
+        self.header = len(records.CSV_HEADER) if skip_headers else 0 # only the first segment's csv header is sent
+        self.sizes = []
+        self.mtime = 0
+        for i, name in enumerate(names):
+            st = os.stat('/sd/' + name)
+            self.sizes.append(st[6] - (self.header if i else 0))
+            if st[8] > self.mtime: self.mtime = st[8]
+        self.size = sum(self.sizes)
+        self.etag = f'"{len(names):x}-{self.size:x}-{self.mtime:x}"'
+        self.index, self.offset = 0, 0 # next segment to open and where to start in it
+        self.remaining = self.size
+        self.file = None
+
+    def seek(self, position, length):
+        """
+        Send length bytes from position instead of everything, for Range requests
+        """
+        self.index = 0
+        while self.index < len(self.sizes) - 1 and position >= self.sizes[self.index]:
+            position -= self.sizes[self.index]
+            self.index += 1
+        self.offset = position
+        self.remaining = length
+
+    def step(self) -> int:
+        """
+        Fills chunk and returns how many bytes to send, 0 once everything has been sent
+        """
+        while self.remaining > 0:
+            if self.file is None:
+                if self.index >= len(self.names): return 0
+                self.file = open('/sd/' + self.names[self.index], 'rb')
+                self.file.seek(self.offset + (self.header if self.index else 0))
+                self.index += 1
+                self.offset = 0
+            n = self.file.readinto(chunk_view[:min(len(chunk), self.remaining)])
+            if n:
+                self.remaining -= n
+                return n
+            self.close()
+        return 0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+def convert_segments(names):
+    """
+    Yields bin segments one after the other converted to csv lines, only the first segment's csv header is kept
+    """
+    for i, name in enumerate(names):
+        with open('/sd/' + name, 'rb') as file:
+            lines = records.convert(file, "csv")
+            if i: next(lines, None) # skip the repeated header
+            for line in lines: yield line
+
+def stream_range(names, file_type, start, end):
+    """
+    Yields the rows between start and end (seconds since 1970). Each segment's index gives the offset of a row just
+    before start so only the rows in the range are read, bin segments are converted to csv
+    """
+    if file_type != "txt": yield records.CSV_HEADER
+    chunk = []
+    size = 0
+    for name in names:
+        offset = SDsave.index_offset(name, start)
+        if file_type == "bin":
+            with open('/sd/' + name, 'rb') as file:
+                file.seek(max(offset, records.HEADER_SIZE))
+                buf = bytearray(records.RECORD_SIZE)
+                while file.readinto(buf) == records.RECORD_SIZE:
+                    time, values = records.unpack(buf)
+                    seconds = records.epoch(time)
+                    if seconds < start: continue
+                    if seconds > end: break
+                    line = records.format_line(time, values, "csv")
+                    chunk.append(line)
+                    size += len(line)
+                    if size >= 512:
+                        yield "".join(chunk)
+                        chunk, size = [], 0
         else:
-            client.sendall(response)
+            with open('/sd/' + name, 'r') as file:
+                file.seek(offset)
+                while True:
+                    line = file.readline()
+                    if not line: break
+                    seconds = records.line_epoch(line)
+                    if seconds is None or seconds < start: continue # csv header
+                    if seconds > end: break
+                    chunk.append(line)
+                    size += len(line)
+                    if size >= 512:
+                        yield "".join(chunk)
+                        chunk, size = [], 0
+    if chunk: yield "".join(chunk)
+
+def stream_rollups(rollup, start, end):
+    """
+    Yields the saved rollups between start and end as csv, followed by the one still open
+    """
+    yield rollups.CSV_HEADER
+    with open('/sd/' + SDsave.ROLLUPS[rollup.period], 'rb') as file:
+        for line in rollups.read(file, start, end): yield line
+    if rollup.rows and start <= rollup.start <= end: yield rollups.format_line(rollup.start, rollup.values())
+
+def parse_range(value, size):
+    """
+    (start, end) for 'bytes=N-', 'bytes=N-M' or 'bytes=-N', None if there is no single usable range
+    """
+    if not value.startswith('bytes=') or ',' in value: return None
+    first, _, last = value[6:].partition('-')
+    try:
+        if not first: start, end = max(0, size - int(last)), size - 1 # the last N bytes
+        else: start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError: return None
+    return start, end
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+def gzip_etag(etag) -> str:
+    return etag[:-1] + '-gz"' # the gzipped body is a different set of bytes so it gets its own tag
+
+def http_date(seconds) -> str:
+    t = utime.gmtime(seconds)
+    return f"{DAYS[t[6]]}, {t[2]:02d} {MONTHS[t[1]-1]} {t[0]} {t[3]:02d}:{t[4]:02d}:{t[5]:02d} GMT"
+
+async def send_response(writer, response, content_type, filename=None, headers={}, keep_alive=False, status="200 OK") -> bool:
+    """
+    Sends the response with its length when it is known. Downloads of the whole log also get an ETag and
+    Last-Modified (a matching If-None-Match/If-Modified-Since gets 304 Not Modified) and can be resumed or synced
+    with Range: bytes=N- (206 Partial Content). Web page files and downloads are gzipped if the client accepts it.
+    Returns True if the connection can be used for another request, which needs the length to be known
+    """
+    try:
+        lines = [f"Content-Type: {content_type}"]
+        if filename: lines.append(f'Content-Disposition: attachment; filename="{filename}"')
+        gzip = 'gzip' in headers.get('accept-encoding', '') and gzip_available()
+        stream = None # set to a Gzip to compress the body as it is sent
+        if isinstance(response, str): response = response.encode('utf-8')
+        if isinstance(response, bytes): lines.append(f"Content-Length: {len(response)}")
+        elif isinstance(response, Asset):
+            compressed = gzip and response.gz
+            lines += [f"ETag: {gzip_etag(response.etag) if compressed else response.etag}", "Cache-Control: no-cache", "Vary: Accept-Encoding"] # browsers check back, getting a 304 if unchanged
+            if headers.get('if-none-match') in (response.etag, gzip_etag(response.etag)): status, response = "304 Not Modified", b""
+            elif compressed:
+                lines.append("Content-Encoding: gzip")
+                response = response.gz
+            else: response = response.body
+            lines.append(f"Content-Length: {len(response)}")
+        elif isinstance(response, Download):
+            modified = http_date(response.mtime)
+            compressed = gzip and 'range' not in headers # ranges are of the plain file, so only compress whole downloads
+            lines += [f"ETag: {gzip_etag(response.etag) if compressed else response.etag}", f"Last-Modified: {modified}", "Accept-Ranges: bytes", "Vary: Accept-Encoding"]
+            wanted = parse_range(headers.get('range', ''), response.size)
+            if headers.get('if-range', response.etag) not in (response.etag, modified): wanted = None # changed since, send it all
+            if headers.get('if-none-match') in (response.etag, gzip_etag(response.etag)) or ('if-none-match' not in headers and headers.get('if-modified-since') == modified):
+                status, response = "304 Not Modified", b""
+            elif wanted and wanted[0] >= response.size:
+                lines += [f"Content-Range: bytes */{response.size}", "Content-Length: 0"]
+                status, response = "416 Range Not Satisfiable", b""
+            elif wanted and wanted[0] <= wanted[1]:
+                status = "206 Partial Content"
+                response.seek(wanted[0], wanted[1] - wanted[0] + 1)
+                lines += [f"Content-Range: bytes {wanted[0]}-{wanted[1]}/{response.size}", f"Content-Length: {response.remaining}"]
+            elif compressed:
+                lines.append("Content-Encoding: gzip")
+                stream = Gzip()
+            else: lines.append(f"Content-Length: {response.size}")
+        elif gzip: # generator
+            lines += ["Content-Encoding: gzip", "Vary: Accept-Encoding"]
+            stream = Gzip()
+        keep_alive = keep_alive and (status.startswith("304") or any(line.startswith("Content-Length") for line in lines)) # otherwise the end of the body is when the connection closes
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write((f"HTTP/1.1 {status}\r\n" + "\r\n".join(lines) + "\r\n\r\n").encode())
+        if isinstance(response, bytes):
+            writer.write(response)
+        elif isinstance(response, Download):
+            try:
+                while True:
+                    n = response.step()
+                    if not n: break
+                    writer.write(stream.compress(chunk_view[:n]) if stream else chunk_view[:n])
+                    await writer.drain() # other clients and the station's tasks run while this chunk goes out
+            finally: response.close()
+        else: # generator, send each part as it is made
+            for part in response:
+                writer.write(stream.compress(part.encode('utf-8')) if stream else part.encode('utf-8'))
+                await writer.drain()
+        if stream: writer.write(stream.finish())
+        await writer.drain()
+        return keep_alive
     except Exception as e:
         print(f"Error sending response: {e}")
+        return False
 
 def initialise():
     """
-    Connect to network and open a socket
+    Connect to network and sync the rtc module
     """
-    config = configparser.ConfigParser()
-    config.read("settings.ini")
+    config = settings.Settings()
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
-    wlan.connect(config["Wi-Fi Settings"]["Wi-Fi SSID"], config["Wi-Fi Settings"]["Wi-Fi Pass"])
+    wlan.connect(config.wifi_ssid, config.wifi_pass)
 
     # Wait for connection
     max_wait = 120
@@ -144,40 +565,122 @@ def initialise():
         rtc = ds3231.DS3231(i2c) # declare rtc here incase of error which can be handled by main
         rtc.set_time(sync_time()) # sync ds3231 rtc module with network time protocol (ntp)
 
-        # Open socket
-        addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
-        s = socket.socket()
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind(addr)
-        s.listen(5)
-        s.setblocking(False)  # Set the socket to non-blocking
-        print('listening on', addr)
-        clients = []
-        return [addr,s,clients]
+MAX_SUBSCRIBERS = 4 # /events clients at once, each one holds a socket and a little RAM
+MAX_MISSED = 5 # events in a row a subscriber can still be sending the last one for before it is dropped
+DRAIN_TIMEOUT = 10 # seconds a subscriber has to take what it was sent
+subscribers = [] # Subscriber for each /events client
+events_sent = 0
+events_dropped = 0
+
+class Subscriber:
+    """
+    An open /events connection. publish() only leaves the latest event here and wakes the subscriber's own task,
+    which is the only thing that writes to the connection
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self.ready = uasyncio.Event()
+        self.event = None # waiting to be sent
+        self.missed = 0 # events replaced before the task got to them
+        self.dropped = False
 
-def server(addr,s,clients):
+def publish():
+    """
+    Hands the latest reading to every /events client, called by main every Update Interval. live.current is made
+    into an event once for all of them and nothing here touches the network. A client still sending an older event
+    only gets the newest one, and one that misses more than MAX_MISSED in a row is dropped instead of holding up
+    the display
     """
-    Main webserver code
+    global events_dropped
+    if not subscribers: return
+    event = b"data: " + live.current + b"\n\n"
+    for sub in subscribers:
+        if sub.dropped: continue
+        if sub.event is not None: # the last one hasn't gone out yet
+            sub.missed += 1
+            if sub.missed > MAX_MISSED:
+                sub.dropped = True
+                events_dropped += 1
+        sub.event = event
+        sub.ready.set()
+
+async def events(writer):
     """
-    # Accept new connections
+    Server-Sent Events, keeps the connection open and pushes the latest reading every Update Interval:
+    data: {"time": "2026-10-18T12:00:00", "rpm": 120.5, ...}
+    """
+    global events_sent
+    if len(subscribers) >= MAX_SUBSCRIBERS:
+        writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: text/plain\r\nRetry-After: 10\r\nConnection: close\r\n\r\nToo many /events clients\n")
+        await writer.drain()
+        return
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+    writer.write(b"retry: 5000\ndata: " + live.current + b"\n\n") # the browser reconnects after 5s if dropped
+    sub = Subscriber(writer)
+    subscribers.append(sub)
     try:
-        cl, addr = s.accept()
-        cl.setblocking(False)
-        clients.append(cl)
-    except OSError:
-        pass  # No new connection, continue
-    
-    for client in clients[:]:
+        while not sub.dropped:
+            await uasyncio.wait_for(writer.drain(), DRAIN_TIMEOUT) # only this client waits on its socket
+            sub.missed = 0
+            await sub.ready.wait()
+            sub.ready.clear()
+            if sub.dropped: break
+            event, sub.event = sub.event, None
+            writer.write(event)
+            events_sent += 1
+    except (OSError, uasyncio.TimeoutError):
+        pass
+    finally:
+        subscribers.remove(sub)
+
+async def serve(reader, writer):
+    """
+    Handle a single client, runs as its own task so sampling keeps going while it waits on the network. Requests
+    are read as they arrive and answered in turn until the client closes the connection, asks for it to be closed,
+    goes quiet for IDLE_TIMEOUT or takes longer than READ_TIMEOUT to send a request
+    """
+    global connections
+    if connections >= MAX_CONNECTIONS:
         try:
-            request = client.recv(1024)
-            if request:
-                response, content_type, *extra = handle_request(request) # type: ignore
-                filename = extra[0] if extra else None
-                send_response(client, response, content_type, filename)
-                client.close()
-                clients.remove(client)
-            else:
-                client.close()
-                clients.remove(client)
-        except OSError:
-            pass  # No data, continue
\ No newline at end of file
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: text/plain\r\nRetry-After: 5\r\nContent-Length: 17\r\nConnection: close\r\n\r\nToo many clients\n")
+            await writer.drain()
+        except OSError: pass
+        writer.close()
+        await writer.wait_closed()
+        return
+    connections += 1
+    parser = Parser()
+    try:
+        keep_alive = True
+        while keep_alive:
+            request = await read_request(reader, parser)
+            if request is None: break # closed by the client
+            if request.method == 'GET' and request.path == '/events':
+                await events(writer) # stays open until the client goes away or is dropped
+                break
+            t = profiler.start()
+            response, content_type, *extra = handle_request(request) # type: ignore
+            filename = extra[0] if extra else None
+            status = extra[1] if len(extra) > 1 else "200 OK"
+            keep_alive = await send_response(writer, response, content_type, filename, request.headers, request.keep_alive, status)
+            profiler.stop(profiler.WEB, t)
+    except ValueError as e: # bad request
+        try:
+            writer.write(f"HTTP/1.1 400 Bad Request\r\nContent-Type: text/plain\r\nContent-Length: {len(str(e)) + 1}\r\nConnection: close\r\n\r\n{e}\n".encode())
+            await writer.drain()
+        except OSError: pass
+    except uasyncio.TimeoutError:
+        pass # idle or too slow, just close it
+    except OSError as e:
+        print(f"Error handling client: {e}")
+    finally:
+        connections -= 1
+        writer.close()
+        await writer.wait_closed()
+
+async def start(port=80):
+    """
+    Main webserver code, starts listening for clients in the background
+    """
+    await uasyncio.start_server(serve, '0.0.0.0', port, backlog=5)
+    print('listening on port', port)
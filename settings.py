@@ -0,0 +1,145 @@
+import os, configparser, calibration
+
+"""
+Typed settings
+
+settings.ini is parsed, converted and checked once into a Settings object with one attribute per setting, so
+nothing on the hot path looks up or converts strings. Like ConfigParser it is a singleton, every module gets the
+same object. check() reloads the file if its size or modification time has changed, the attributes are updated in
+place so modules holding the object see the new values
+
+Usage:
+config = settings.Settings()
+config.load("settings.ini")
+if config.debug: print(config.log_interval)
+"""
+
+def _bool(value) -> bool:
+    value = value.lower()
+    if value in ('true', 'yes', 'on', '1'): return True
+    if value in ('false', 'no', 'off', '0'): return False
+    raise ValueError(f"'{value}' isn't True or False")
+
+def _choice(*options):
+    def check(value):
+        if value not in options: raise ValueError(f"'{value}' isn't one of {', '.join(options)}")
+        return value
+    return check
+
+def _positive(value) -> int:
+    value = int(value)
+    if value <= 0: raise ValueError(f"{value} must be above 0")
+    return value
+
+def _non_negative(value) -> int:
+    value = int(value)
+    if value < 0: raise ValueError(f"{value} can't be below 0")
+    return value
+
+def _range(low, high):
+    def check(value) -> int:
+        value = int(value)
+        if not low <= value <= high: raise ValueError(f"{value} must be between {low} and {high}")
+        return value
+    return check
+
+def _adc(value) -> int:
+    value = int(value)
+    if not 0 <= value <= 65535: raise ValueError(f"{value} must be between 0 and 65535")
+    return value
+
+# attribute, section, option, converter, default (None means the setting is required)
+SCHEMA = (
+    ("wifi_ssid", "Wi-Fi Settings", "Wi-Fi SSID", str, ""),
+    ("wifi_pass", "Wi-Fi Settings", "Wi-Fi Pass", str, ""),
+    ("time_zone_offset", "NTP Settings", "Time Zone Offset", int, "0"),
+    ("ntp_server", "NTP Settings", "NTP Server", str, "pool.ntp.org"),
+    ("threshold", "RPM", "Threshold", _adc, "60000"),
+    ("rising_threshold", "RPM", "Rising Threshold", _adc, ""), # defaults to threshold
+    ("falling_threshold", "RPM", "Falling Threshold", _adc, ""), # defaults to threshold
+    ("min_dwell", "RPM", "Min Dwell", _non_negative, "0"),
+    ("block_size", "RPM", "Block Size", _positive, "16"),
+    ("max_time_diff", "RPM", "Max Time Diff", _positive, None),
+    ("timeout", "RPM", "Timeout", _positive, None),
+    ("update_interval", "RPM", "Update Interval", _positive, None),
+    ("log_interval", "RPM", "Log Interval", _positive, None),
+    ("capture_mode", "RPM", "Capture Mode", _choice("timer", "irq", "poll"), "timer"),
+    ("sample_period", "RPM", "Sample Period", _positive, "1"),
+    ("process_interval", "RPM", "Process Interval", _positive, "5"),
+    ("average_edges", "RPM", "Average Edges", _positive, "4"),
+    ("debug", "Other", "Debug", _bool, "False"),
+    ("file_type", "Other", "File Type", _choice("txt", "csv", "bin"), "csv"),
+    ("segment_days", "Other", "Segment Days", _positive, "1"),
+    ("keep_days", "Other", "Keep Days", _non_negative, "0"), # a negative value would delete every old segment
+    ("index_rows", "Other", "Index Rows", _positive, "6"),
+    ("profiling", "Other", "Profiling", _bool, "False"),
+    ("profile_interval", "Other", "Profile Interval", _positive, "600000"),
+    ("settings_check_interval", "Other", "Settings Check Interval", _positive, "5000"),
+    ("flush_size", "Other", "Flush Size", _range(1, 2048), "512"), # at most half of SDsave.max_buffered
+    ("flush_age", "Other", "Flush Age", _positive, "30000"),
+    ("checkpoint_interval", "Other", "Checkpoint Interval", _positive, "60000"),
+    ("error_window", "Other", "Error Window", _positive, "60000"),
+    ("max_error_lines", "Other", "Max Error Lines", _positive, "10"),
+)
+
+class Settings:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Settings, cls).__new__(cls)
+            cls._instance.path = None
+            cls._instance.stamp = None
+            cls._instance.reloads = 0
+        return cls._instance
+
+    def load(self, path="settings.ini"):
+        """
+        Parse settings.ini, does nothing if it has already been loaded. Raises ValueError if a setting is missing or invalid
+        """
+        if self.path is not None: return
+        self.path = path
+        try:
+            self.stamp = self._stamp()
+            self._compile()
+        except Exception:
+            self.path = None
+            raise
+
+    def check(self) -> bool:
+        """
+        Reload settings.ini if it has changed since it was loaded, returns True if it was reloaded. If the new file
+        is invalid the old settings are kept and the error is raised
+        """
+        stamp = self._stamp()
+        if stamp == self.stamp: return False
+        self.stamp = stamp
+        self._compile()
+        self.reloads += 1
+        return True
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return (st[6], st[8]) # size, modification time
+
+    def _compile(self):
+        parser = configparser.ConfigParser()
+        parser.config, parser.file_read = {}, False # the parser is a singleton, make it read the file again
+        parser.read(self.path)
+        values = {}
+        for attr, section, option, convert, default in SCHEMA:
+            value = parser.get(section, option, default)
+            if value is None: raise ValueError(f"settings.ini [{section}] {option} is missing")
+            if value == "" and convert is not str:
+                values[attr] = None
+                continue
+            try: values[attr] = convert(value)
+            except ValueError as e: raise ValueError(f"settings.ini [{section}] {option}: {e}")
+        if values["rising_threshold"] is None: values["rising_threshold"] = values["threshold"]
+        if values["falling_threshold"] is None: values["falling_threshold"] = values["threshold"]
+        if values["falling_threshold"] > values["rising_threshold"]:
+            raise ValueError("settings.ini [RPM] Falling Threshold must not be above Rising Threshold")
+        try: values["calibration"] = calibration.from_config(parser) # rpm to wind speed lookup table, None if not set
+        except (ValueError, ZeroDivisionError) as e: raise ValueError(f"settings.ini [Calibration]: {e}")
+        # only update once everything is valid so a bad edit never leaves half the settings changed
+        for attr, value in values.items(): setattr(self, attr, value)
@@ -0,0 +1,139 @@
+"""
+Constant memory statistics for each log interval
+
+Stats keeps the count, min, max, mean and standard deviation (Welford's method) of a stream of values and
+estimates percentiles with the P² algorithm (Jain & Chlamtac), so nothing grows with the length of the interval
+"""
+
+class P2:
+    """
+    Streaming estimate of a single percentile using 5 markers
+    """
+    def __init__(self, p):
+        self.p = p
+        self.q = [0.0]*5 # marker heights
+        self.n = [0]*5 # marker positions
+        self.desired = [0.0]*5 # desired marker positions
+        self.step = [0, p/2, p, (1+p)/2, 1] # desired position increments
+        self.reset()
+
+    def reset(self):
+        p = self.p
+        for i in range(5): self.n[i] = i
+        self.desired[0], self.desired[1], self.desired[2], self.desired[3], self.desired[4] = 0, 2*p, 4*p, 2+2*p, 4
+        self.count = 0
+
+    def add(self, x):
+        q, n = self.q, self.n
+        if self.count < 5: # collect the first 5 values as the initial markers
+            q[self.count] = x
+            self.count += 1
+            if self.count == 5: q.sort()
+            return
+        self.count += 1
+
+        # find the cell x falls in and adjust the extreme markers
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k+1]: k += 1
+        for i in range(k+1, 5): n[i] += 1
+        for i in range(5): self.desired[i] += self.step[i]
+
+        # adjust the middle markers if they've drifted from where they should be
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i+1] - n[i] > 1) or (d <= -1 and n[i-1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # piecewise parabolic prediction
+                qp = q[i] + d / (n[i+1] - n[i-1]) * ((n[i] - n[i-1] + d) * (q[i+1] - q[i]) / (n[i+1] - n[i]) + (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / (n[i] - n[i-1]))
+                if q[i-1] < qp < q[i+1]: q[i] = qp
+                else: q[i] = q[i] + d * (q[i+d] - q[i]) / (n[i+d] - n[i]) # fall back to linear
+                n[i] += d
+
+    def state(self) -> list:
+        """
+        Marker heights, positions and the count, enough for restore() to carry on where this left off
+        """
+        return self.q + self.n + [self.count]
+
+    def restore(self, values):
+        self.q[:] = values[0:5]
+        for i in range(5): self.n[i] = int(values[5+i])
+        self.count = int(values[10])
+        added = max(0, self.count - 5) # the desired positions move by step for every value after the first 5
+        init = (0, 2*self.p, 4*self.p, 2+2*self.p, 4)
+        for i in range(5): self.desired[i] = init[i] + added * self.step[i]
+
+    def value(self) -> float:
+        if self.count >= 5: return self.q[2]
+        if self.count == 0: return 0
+        # not enough values for the markers yet, use the exact percentile
+        values = sorted(self.q[:self.count])
+        return values[round(self.p * (self.count - 1))]
+
+class Stats:
+    """
+    Running min, max, mean, standard deviation and percentiles of a stream of values. min, max and mean are None
+    until a value has been added, so an interval with no readings isn't mistaken for readings of 0
+    """
+    def __init__(self, percentiles=(0.5, 0.9)):
+        self.percentiles = [P2(p) for p in percentiles]
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._mean = 0
+        self.m2 = 0 # sum of squared differences from the mean
+        self._min = 0
+        self._max = 0
+        for p in self.percentiles: p.reset()
+
+    def add(self, x):
+        self.count += 1
+        if self.count == 1: self._min = self._max = x
+        elif x < self._min: self._min = x
+        elif x > self._max: self._max = x
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self.m2 += delta * (x - self._mean)
+        for p in self.percentiles: p.add(x)
+
+    def state(self) -> list:
+        """
+        Everything needed to carry on the interval after a restart as a list of numbers, see checkpoint.py
+        """
+        values = [self.count, self._mean, self.m2, self._min, self._max]
+        for p in self.percentiles: values += p.state()
+        return values
+
+    def restore(self, values):
+        self.count = int(values[0])
+        self._mean, self.m2, self._min, self._max = values[1], values[2], values[3], values[4]
+        for i, p in enumerate(self.percentiles): p.restore(values[5+i*11:16+i*11])
+
+    def state_size(self) -> int:
+        return 5 + 11 * len(self.percentiles)
+
+    @property
+    def min(self): return self._min if self.count else None
+
+    @property
+    def max(self): return self._max if self.count else None
+
+    @property
+    def mean(self): return self._mean if self.count else None
+
+    def std(self) -> float:
+        return (self.m2 / self.count) ** 0.5 if self.count > 1 else 0
+
+    def percentile(self, i) -> float:
+        """
+        Returns the estimate for the i'th percentile given when created, e.g. percentile(0) is the median by default
+        """
+        return self.percentiles[i].value()
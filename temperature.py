@@ -1,13 +1,78 @@
-import machine, dht, SDsave
+import machine, dht, _thread, utime, gc
 dht_sensor = dht.DHT22(machine.Pin(22)) # define temperature & humidity sensor
 def read() -> list[int]|list:
     """
-    Returns the current temperature and humidity as [Temp,Hum]. Returns [None, e] if an error occurred
+    Returns the current temperature and humidity as [Temp,Hum]. Returns [None, e] if an error occurred, the caller
+    reports it as this runs on the second core which must never touch the SD card
     """
     try:
         # Trigger a measurement
         dht_sensor.measure()
         return [round(dht_sensor.temperature(),1), round(dht_sensor.humidity(),1)]
     except Exception as e:
-        SDsave.error(e, "Error reading temperature and humidity")
-        return [None,e]
\ No newline at end of file
+        return [None,e]
+
+class Mailbox:
+    """
+    Latest reading from the sensor worker, guarded by a lock. seq goes up by one with every new reading so the
+    reader can tell if it has already seen it
+    """
+    def __init__(self):
+        self.lock = _thread.allocate_lock()
+        self.seq = 0
+        self.temp, self.hum, self.error = 0, 0, None
+
+    def put(self, temp, hum, error=None):
+        with self.lock:
+            self.temp, self.hum, self.error = temp, hum, error
+            self.seq += 1
+
+    def get(self) -> tuple:
+        """
+        Returns (seq, temp, hum, error)
+        """
+        with self.lock:
+            return (self.seq, self.temp, self.hum, self.error)
+
+mailbox = Mailbox()
+running = False
+gc_requested = False
+
+def collect_garbage():
+    """
+    Ask the worker to run gc.collect() after its next reading so the first core doesn't have to
+    """
+    global gc_requested
+    gc_requested = True
+
+def worker(interval):
+    """
+    Reads the temperature and humidity every interval ms on the second core as to not interfere with first cores calculations.
+    Errors only go through the mailbox, main logs them on the first core (FatFs and the SD card's sector cache
+    aren't safe to use from both cores)
+    """
+    global gc_requested
+    while running:
+        start = utime.ticks_ms()
+        temp, hum = read()
+        if temp is None: mailbox.put(None, None, hum)
+        else: mailbox.put(temp, hum)
+        if gc_requested:
+            try: gc.collect()
+            except Exception as e: mailbox.put(None, None, e)
+            gc_requested = False
+        remaining = interval - utime.ticks_diff(utime.ticks_ms(), start)
+        if remaining > 0: utime.sleep_ms(remaining)
+
+def start(interval=1000):
+    """
+    Start the worker on the second core, only one worker is ever started
+    """
+    global running
+    if running: return
+    running = True
+    _thread.start_new_thread(worker, (interval,))
+
+def stop():
+    global running
+    running = False